@@ -4,6 +4,8 @@ import json
 
 import aws_cdk
 from src_cdk.web_system_stack import WebSystemStack
+from src_cdk.template_util import render_obj
+from src_cdk.creator.reference_solver import ReferenceSolver
 
 
 def read_spec(spec_path: str, env: dict):
@@ -13,18 +15,20 @@ def read_spec(spec_path: str, env: dict):
     - {$account}: AWSアカウント名で置換します
     - {$region}: AWSリージョン名で置換します
     - {$service_name}: spec定義ファイルで定義するservice_nameで置換します
+    上記以外の{$...}が含まれる場合はエラーになります
     """
 
     with open(spec_path,"r", encoding="utf-8") as f:
-        text = f.read()
-        raw_api_spec: str = json.loads(text)
+        raw_api_spec: dict = json.load(f)
 
-        replaced_text = (
-            text.replace("{$service_name}", raw_api_spec["service_name"])
-            .replace("{$account}", env["account"])
-            .replace("{$region}", env["region"])
-        )
-        return json.loads(replaced_text)
+    return render_obj(
+        raw_api_spec,
+        {
+            "service_name": raw_api_spec["service_name"],
+            "account": env["account"],
+            "region": env["region"],
+        },
+    )
 
 
 pwd = os.path.dirname(os.path.abspath(__file__))
@@ -33,7 +37,11 @@ env = {
     "region": os.environ["CDK_DEFAULT_REGION"],
 }
 
-app = aws_cdk.App()
+# lambda layerのversionはcdk.context.jsonではなく専用のファイルに保存し、contextとしてAppに渡す
+layer_version_path = f"{pwd}/{ReferenceSolver.LAYER_VERSION_JSON}"
+app = aws_cdk.App(
+    context=ReferenceSolver.read_layer_version_context(layer_version_path)
+)
 spec_path = app.node.try_get_context("spec")
 if spec_path is None:
     print("please set spec")
@@ -53,6 +61,13 @@ stack.create(
     root_path=os.path.dirname(spec_path),
     schema_path=f"{pwd}/spec/schema.json",
     access_token=os.environ.get("GITHUB_PAT"),
+    cache_dir=(
+        app.node.try_get_context("synth_cache_dir") or f"{pwd}/.synth_cache"
+        if app.node.try_get_context("synth_cache") != "false"
+        else None
+    ),
+    profile_path=app.node.try_get_context("profile"),
+    layer_version_path=layer_version_path,
 )
 
 app.synth()
@@ -1,4 +1,5 @@
 import json
+import re
 import traceback
 import os
 
@@ -7,6 +8,9 @@ import boto3
 ENV_BRANCH_KEY = "Branch"
 ENV_SERVICE_KEY = "Service"
 
+PLACEHOLDER_PATTERN = re.compile(r"\{\$([A-Za-z_][A-Za-z0-9_]*)\}")
+_policy_json_dict: dict[tuple, str] = {}
+
 
 def get_account():
     sts = boto3.client("sts")
@@ -28,16 +32,28 @@ def read_policy_json(
     - {$region}: AWSリージョン名で置換します
     - {$service_name}: 引数で指定するservice_nameで置換します
     - {$branch}: 引数で指定するbranchで置換します
+    置換する値が無い{$...}が含まれる場合はエラーになります
+    置換結果はコンテナ内で使い回します（warm start時はファイルを読み直しません）
     """
 
-    with open(json_path) as f:
-        text = f.read()
-        replaced_text = text.replace("{$account}", accout).replace("{$region}", region)
-        if service_name is not None:
-            replaced_text = replaced_text.replace("{$service_name}", service_name)
-        if branch is not None:
-            replaced_text = replaced_text.replace("{$branch}", branch)
-        return replaced_text
+    variable_dict = {"account": accout, "region": region}
+    if service_name is not None:
+        variable_dict["service_name"] = service_name
+    if branch is not None:
+        variable_dict["branch"] = branch
+
+    key = (json_path, tuple(sorted(variable_dict.items())))
+    if key not in _policy_json_dict:
+        with open(json_path) as f:
+            text = f.read()
+
+        def replace(match: re.Match) -> str:
+            if match.group(1) not in variable_dict:
+                raise Exception(f"unknown variable {match.group(0)} in {json_path}")
+            return variable_dict[match.group(1)]
+
+        _policy_json_dict[key] = PLACEHOLDER_PATTERN.sub(replace, text)
+    return _policy_json_dict[key]
 
 
 def create_and_attach_iot_role(
@@ -3,6 +3,24 @@ import os
 
 import boto3
 
+# clientとアカウントIDはLambdaのコンテナが再利用される間（warm start）使い回す
+_client_dict = {}
+_account_id = None
+
+
+def get_client(service_name: str, **kwargs):
+    key = (service_name, tuple(sorted(kwargs.items())))
+    if key not in _client_dict:
+        _client_dict[key] = boto3.client(service_name, **kwargs)
+    return _client_dict[key]
+
+
+def get_account_id() -> str:
+    global _account_id
+    if _account_id is None:
+        _account_id = get_client("sts").get_caller_identity()["Account"]
+    return _account_id
+
 
 class SqsAccess:
     def __init__(
@@ -14,14 +32,10 @@ class SqsAccess:
         )
         self.queue_url = "{}/{}/{}".format(
             self.endpoint_url,
-            (
-                account
-                if account is not None
-                else boto3.client("sts").get_caller_identity()["Account"]
-            ),
+            account if account is not None else get_account_id(),
             queue_name,
         )
-        self.client = boto3.client("sqs", endpoint_url=self.endpoint_url)
+        self.client = get_client("sqs", endpoint_url=self.endpoint_url)
 
     def send_json_message(self, message_dict: dict) -> dict:
         return self.client.send_message(
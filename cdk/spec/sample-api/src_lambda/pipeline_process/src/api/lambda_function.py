@@ -1,37 +1,181 @@
+import base64
 import json
 import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any
 
 import boto3
+from botocore.config import Config
+
+# clientとアカウントIDはLambdaのコンテナが再利用される間（warm start）使い回す
+_client_dict = {}
+_account_id = None
+
+
+def get_client(service_name: str, *, config_dict: dict | None = None, **kwargs):
+    key = (
+        service_name,
+        json.dumps(config_dict, sort_keys=True),
+        tuple(sorted(kwargs.items())),
+    )
+    if key not in _client_dict:
+        _client_dict[key] = boto3.client(
+            service_name,
+            config=Config(**config_dict) if config_dict is not None else None,
+            **kwargs,
+        )
+    return _client_dict[key]
+
+
+def get_account_id() -> str:
+    global _account_id
+    if _account_id is None:
+        _account_id = get_client("sts").get_caller_identity()["Account"]
+    return _account_id
 
 
 class LambdaAccess:
+    DEFAULT_MAX_CONCURRENCY = 10
+    # invoke_manyでtimeout_secを指定した場合のclientの設定（期限を過ぎた呼び出しを再試行しない）
+    NO_RETRY_CONFIG = {"read_timeout": 900, "retries": {"total_max_attempts": 1}}
+
     def __init__(
         self, lambda_name: str, account: str | None = None, region: str | None = None
     ):
-        self.client = boto3.client("lambda")
+        self.client = get_client("lambda")
         self.func_arn = "arn:aws:lambda:{}:{}:function:{}".format(
             region if region is not None else os.environ["AWS_REGION"],
-            (
-                account
-                if account is not None
-                else boto3.client("sts").get_caller_identity()["Account"]
-            ),
+            account if account is not None else get_account_id(),
             lambda_name,
         )
 
-    def invoke(self, *, body_dict: dict | None = None, query_dict: dict | None = None):
+    def invoke(
+        self,
+        *,
+        body_dict: dict | None = None,
+        query_dict: dict | None = None,
+        log_tail: bool = False,
+    ):
+        """
+        lambdaを同期的に呼び出し、その戻り値を返します
+        log_tailがTrueの場合、呼び出したlambdaのログの末尾（最大4KB）を取得しprintします
+        """
+        return self._invoke(
+            self.client,
+            self._create_payload(body_dict, query_dict),
+            log_tail=log_tail,
+        )
+
+    def invoke_async(
+        self, *, body_dict: dict | None = None, query_dict: dict | None = None
+    ) -> int:
+        """
+        lambdaを非同期に（InvocationType="Event"で）呼び出します
+        呼び出したlambdaの終了を待たずに戻ります（戻り値はステータスコードで、受付成功時は202）
+        """
+        return self._invoke(
+            self.client,
+            self._create_payload(body_dict, query_dict),
+            asynchronous=True,
+        )
+
+    def invoke_many(
+        self,
+        kwargs_list: list[dict],
+        *,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout_sec: float | None = None,
+        return_exceptions: bool = False,
+        asynchronous: bool = False,
+        log_tail: bool = False,
+    ) -> list:
+        """
+        invokeを並列に実行し、kwargs_listと同じ順序で結果を返します
+        - kwargs_listの各要素はinvokeのキーワード引数（body_dict, query_dict）の辞書です
+        - 同時に実行する数はmax_concurrencyまでに制限します
+        - timeout_secを指定した場合、timeout_sec秒以内に応答しない呼び出しは（再試行せず）TimeoutErrorで失敗とします
+          （応答を待たずに戻るため、失敗とした呼び出しが呼び出し先で実行されている場合があります）
+        - return_exceptionsがTrueの場合、失敗した呼び出しの結果として例外を返します
+          Falseの場合、全ての呼び出しが終わった後に、最初に失敗した呼び出しの例外をスローします
+        - asynchronousがTrueの場合、invoke_asyncで呼び出します（結果はステータスコードになります）
+        - log_tailはinvokeと同じです（asynchronousがTrueの場合は無視します）
+        """
+        # timeout_secは呼び出し全体の期限としてwaitで判定する
+        # （clientの設定にすると呼び出し毎に別のclientが作成・保持されてしまうため、clientは固定の設定で使い回す）
+        client = (
+            self.client
+            if timeout_sec is None
+            else get_client("lambda", config_dict=self.NO_RETRY_CONFIG)
+        )
+
+        def invoke_safely(kwargs: dict) -> Any:
+            try:
+                return self._invoke(
+                    client,
+                    self._create_payload(**kwargs),
+                    asynchronous=asynchronous,
+                    log_tail=log_tail,
+                )
+            except Exception as ex:
+                return ex
+
+        executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        future_list = [executor.submit(invoke_safely, kwargs) for kwargs in kwargs_list]
+        wait(future_list, timeout=timeout_sec)
+        # 期限までに終わらなかった呼び出しは待たずに失敗とする（未開始の呼び出しは取り消す）
+        executor.shutdown(wait=False, cancel_futures=True)
+        result_list = [
+            (
+                future.result()
+                if future.done() and not future.cancelled()
+                else TimeoutError(
+                    f"invoke {self.func_arn} did not finish in {timeout_sec} sec"
+                )
+            )
+            for future in future_list
+        ]
+
+        if not return_exceptions:
+            for result in result_list:
+                if isinstance(result, Exception):
+                    raise result
+        return result_list
+
+    @staticmethod
+    def _create_payload(
+        body_dict: dict | None = None, query_dict: dict | None = None
+    ) -> dict:
         payload = {}
         if body_dict is not None:
             payload["body"] = json.dumps(body_dict)
         if query_dict is not None:
             payload["queryStringParameters"] = query_dict
+        return payload
+
+    def _invoke(
+        self,
+        client,
+        payload: dict,
+        *,
+        asynchronous: bool = False,
+        log_tail: bool = False,
+    ) -> Any:
+        if asynchronous:
+            response = client.invoke(
+                FunctionName=self.func_arn,
+                InvocationType="Event",
+                Payload=json.dumps(payload),
+            )
+            return response["StatusCode"]
 
-        response = self.client.invoke(
+        response = client.invoke(
             FunctionName=self.func_arn,
             InvocationType="RequestResponse",
-            LogType="Tail",
+            LogType="Tail" if log_tail else "None",
             Payload=json.dumps(payload),
         )
+        if log_tail and "LogResult" in response:
+            print(base64.b64decode(response["LogResult"]).decode("utf-8", "replace"))
 
         return json.load(response["Payload"])
 
@@ -41,16 +185,19 @@ def lambda_handler(event, context):
     output_dict_list = []
     if "Records" in event:
         print("{} records received".format(len(event["Records"])))
-        for record in event["Records"]:
-            sqs_data = json.loads(record["body"])
+        api_name = os.environ["API"]
+        branch = os.environ["Branch"]
+        s3_access = LambdaAccess(f"{api_name}-{branch}-s3_access")
 
-            api_name = os.environ["API"]
-            branch = os.environ["Branch"]
-            LambdaAccess(f"{api_name}-{branch}-s3_access").invoke(
-                body_dict={"data": sqs_data, "msg": "called by pipeline_process"},
-            )
-
-            output_dict_list.append(sqs_data)
+        output_dict_list = [json.loads(record["body"]) for record in event["Records"]]
+        # 全レコード分のs3_accessを並列に呼び出す（このlambdaのタイムアウトまでに応答がなければ失敗とする）
+        s3_access.invoke_many(
+            [
+                {"body_dict": {"data": sqs_data, "msg": "called by pipeline_process"}}
+                for sqs_data in output_dict_list
+            ],
+            timeout_sec=max(context.get_remaining_time_in_millis() / 1000 - 1, 1),
+        )
         print("output:")
         print(output_dict_list)
 
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Any, Callable
+
+import boto3
+from botocore.config import Config
+
+# boto3のclient/resourceをコンテナ内で共有する為のレジストリ
+# - client/resourceは最初に使用された時点で作成します（import時には作成しない）
+# - 作成したclient/resourceはLambdaのコンテナが再利用される間（warm start）使い回します
+# - AWSアカウントIDはコンテナ毎に1度だけstsから取得します
+
+_lock = threading.Lock()
+_client_dict: dict[tuple, Any] = {}
+_resource_dict: dict[tuple, Any] = {}
+_account_id: str | None = None
+
+_timing_hook: Callable[[str, float], None] | None = None
+_timing_list: list[tuple[str, float]] = []
+
+
+def set_timing_hook(hook: Callable[[str, float], None] | None) -> None:
+    """
+    client/resourceの作成やアカウントIDの取得にかかった時間を受け取る関数を設定します
+    hookは(名前, 経過秒)を引数に呼び出されます（例："client:s3", 0.12）
+    """
+    global _timing_hook
+    _timing_hook = hook
+
+
+def get_timing_list() -> list[tuple[str, float]]:
+    """
+    これまでにclient/resourceの作成やアカウントIDの取得にかかった時間の一覧を返します
+    """
+    return list(_timing_list)
+
+
+def _record_timing(name: str, start: float) -> None:
+    elapsed_sec = time.perf_counter() - start
+    _timing_list.append((name, elapsed_sec))
+    if _timing_hook is not None:
+        _timing_hook(name, elapsed_sec)
+
+
+def _to_cache_key(service_name: str, **kwargs) -> tuple:
+    return (service_name, json.dumps(kwargs, sort_keys=True))
+
+
+def get_client(
+    service_name: str,
+    *,
+    endpoint_url: str | None = None,
+    region_name: str | None = None,
+    config_dict: dict | None = None,
+) -> Any:
+    """
+    service_nameのclientを返します（同じ引数で作成済みであれば作成済みのclientを返します）
+    config_dictはbotocore.config.Configの引数として使用します（例：{"read_timeout": 10}）
+    """
+    key = _to_cache_key(
+        service_name,
+        endpoint_url=endpoint_url,
+        region_name=region_name,
+        config_dict=config_dict,
+    )
+    with _lock:
+        if key not in _client_dict:
+            start = time.perf_counter()
+            _client_dict[key] = boto3.client(
+                service_name,
+                endpoint_url=endpoint_url,
+                region_name=region_name,
+                config=Config(**config_dict) if config_dict is not None else None,
+            )
+            _record_timing("client:{}".format(service_name), start)
+        return _client_dict[key]
+
+
+def get_resource(
+    service_name: str,
+    *,
+    region_name: str | None = None,
+) -> Any:
+    """
+    service_nameのresourceを返します（同じ引数で作成済みであれば作成済みのresourceを返します）
+    注）resourceはスレッドセーフではないので、複数スレッドから使用する場合はget_clientを使用してください
+    """
+    key = _to_cache_key(service_name, region_name=region_name)
+    with _lock:
+        if key not in _resource_dict:
+            start = time.perf_counter()
+            _resource_dict[key] = boto3.resource(service_name, region_name=region_name)
+            _record_timing("resource:{}".format(service_name), start)
+        return _resource_dict[key]
+
+
+def get_account_id() -> str:
+    """
+    実行中のAWSアカウントIDを返します（stsへの問い合わせはコンテナ毎に1度だけ行います）
+    """
+    global _account_id
+    if _account_id is None:
+        sts = get_client("sts")
+        start = time.perf_counter()
+        _account_id = sts.get_caller_identity()["Account"]
+        _record_timing("sts:get_caller_identity", start)
+    return _account_id
+
+
+def clear() -> None:
+    """
+    作成済みのclient/resourceとアカウントIDを破棄します
+    """
+    global _account_id
+    with _lock:
+        _client_dict.clear()
+        _resource_dict.clear()
+        _account_id = None
@@ -1,16 +1,22 @@
 from __future__ import annotations
 
+import base64
 import json
 import math
 import os
 import re
+import threading
+import time
 import traceback
 import logging
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from glob import glob
 from enum import Enum
-from typing import Any
+from functools import partial
+from typing import Any, Callable, Iterator
 
-import boto3
+from boto3.s3.transfer import TransferConfig
 
 try:
     from mypy_boto3_s3 import S3Client, S3ServiceResource
@@ -18,6 +24,7 @@ except Exception:
     # fallback if import failed:
     print("mypy_boto3 not found")
 
+from .aws_client_util import get_account_id, get_client, get_resource
 from .type_util import is_type
 
 logging.basicConfig(level=logging.INFO)
@@ -89,8 +96,11 @@ class ApiGatewayEventAnalyzer:
         optionsに{"convert_to_boolean":True}や{"convert_to_int":True}を指定することでboolean型やint型に変換できます
     """
 
+    logger = logging.getLogger("ApiGatewayEventAnalyzer")
+
     def __init__(self, event: dict):
         self.event = event
+        self.record_exception_dict: dict[str, BaseException] = {}
 
     def solve_http_params(self, params_dict: dict) -> dict:
         """
@@ -148,25 +158,84 @@ class ApiGatewayEventAnalyzer:
             print("{} records received".format(len(self.event["Records"])))
 
             for record in self.event["Records"]:
-                sqs_data = json.loads(record["body"])
-                params = {}
-                for key, spec in params_dict.items():
-                    options = spec["options"] if "options" in spec else {}
-                    if spec["required"]:
-                        options["raise_if_absent"] = True
-
-                    if spec["where"] == "sqs":
-                        value = self._get_param_value(
-                            sqs_data,
-                            key,
-                            spec.get("type"),
-                            spec.get("default"),
-                            **options,
-                        )
-                    params[key] = value
-                params_list.append(params)
+                params_list.append(self._solve_sqs_record_params(record, params_dict))
         return params_list
 
+    def process_sqs_records(
+        self,
+        handler: Callable[[dict], Any],
+        params_dict: dict | None = None,
+        *,
+        max_workers: int | None = None,
+    ) -> dict:
+        """
+        sqsから受け取ったレコードを1件ずつhandlerで処理し、失敗したレコードをbatchItemFailuresの形式で返します
+        - params_dictを指定した場合、handlerにはwhereが"sqs"のパラメータを取り出した辞書を渡します
+          指定しない場合、handlerにはbodyをJSONとしてパースした結果を渡します
+        - max_workersを指定した場合、レコードをスレッドプールで並列に処理します
+        - パラメータの取り出しもしくはhandlerで例外が発生したレコードは失敗として記録し、
+          他のレコードの処理は継続します（例外はrecord_exception_dictにmessageId毎に保持します）
+
+        戻り値をlambdaの戻り値として返すと、sqs側でreport_batch_item_failuresが有効な場合、
+        失敗したレコードのみが再実行されます
+        """
+
+        record_list = self.event.get("Records", [])
+        print(
+            "process_sqs_records called: {} records received".format(len(record_list))
+        )
+
+        def process_safely(record: dict) -> BaseException | None:
+            try:
+                if params_dict is not None:
+                    handler(self._solve_sqs_record_params(record, params_dict))
+                else:
+                    handler(json.loads(record["body"]))
+                return None
+            except (Exception, WebApiException) as ex:
+                self.logger.error(
+                    "failed to process record {}".format(record.get("messageId")),
+                    exc_info=True,
+                )
+                return ex
+
+        if max_workers is None:
+            ex_list = [process_safely(record) for record in record_list]
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                ex_list = list(executor.map(process_safely, record_list))
+
+        self.record_exception_dict = {
+            record["messageId"]: ex
+            for record, ex in zip(record_list, ex_list)
+            if ex is not None
+        }
+        return {
+            "batchItemFailures": [
+                {"itemIdentifier": message_id}
+                for message_id in self.record_exception_dict
+            ]
+        }
+
+    def _solve_sqs_record_params(self, record: dict, params_dict: dict) -> dict:
+        sqs_data = json.loads(record["body"])
+        params = {}
+        for key, spec in params_dict.items():
+            options = spec["options"] if "options" in spec else {}
+            if spec["required"]:
+                options["raise_if_absent"] = True
+
+            if spec["where"] == "sqs":
+                value = self._get_param_value(
+                    sqs_data,
+                    key,
+                    spec.get("type"),
+                    spec.get("default"),
+                    **options,
+                )
+            params[key] = value
+        return params
+
     @staticmethod
     def _get_param_value(
         dictionary: dict,
@@ -323,15 +392,178 @@ class ApiGatewayEventAnalyzer:
             return "unknown"
 
 
+class TransferReport:
+    """
+    S3Accessによる複数ファイルの転送結果（転送・スキップ・失敗したkeyとそのバイト数、スループット）を集計します
+    ※複数スレッドから同時に追加されることを想定しています
+    """
+
+    def __init__(self):
+        self.transferred_keys: list[str] = []
+        self.skipped_keys: list[str] = []
+        self.failed_keys: dict[str, str] = {}
+        self.transferred_bytes = 0
+        self.skipped_bytes = 0
+        self.failed_bytes = 0
+        self.start_time = time.perf_counter()
+        self.elapsed_sec: float | None = None
+        self._lock = threading.Lock()
+
+    def add_transferred(self, key: str, size: int) -> None:
+        with self._lock:
+            self.transferred_keys.append(key)
+            self.transferred_bytes += size
+
+    def add_skipped(self, key: str, size: int) -> None:
+        with self._lock:
+            self.skipped_keys.append(key)
+            self.skipped_bytes += size
+
+    def add_failed(self, key: str, size: int, ex: Exception) -> None:
+        with self._lock:
+            self.failed_keys[key] = "{}: {}".format(type(ex).__name__, ex)
+            self.failed_bytes += size
+
+    def finish(self) -> None:
+        self.elapsed_sec = time.perf_counter() - self.start_time
+
+    def get_mb_per_sec(self) -> float | None:
+        if not self.elapsed_sec:
+            return None
+        return self.transferred_bytes / 1024 / 1024 / self.elapsed_sec
+
+    def get_files_per_sec(self) -> float | None:
+        if not self.elapsed_sec:
+            return None
+        return len(self.transferred_keys) / self.elapsed_sec
+
+    def to_dict(self) -> dict:
+        return {
+            "elapsed_sec": self.elapsed_sec,
+            "mb_per_sec": self.get_mb_per_sec(),
+            "files_per_sec": self.get_files_per_sec(),
+            "transferred": len(self.transferred_keys),
+            "skipped": len(self.skipped_keys),
+            "failed": len(self.failed_keys),
+            "transferred_bytes": self.transferred_bytes,
+            "skipped_bytes": self.skipped_bytes,
+            "failed_bytes": self.failed_bytes,
+            "failed_keys": self.failed_keys,
+        }
+
+
+class ListingCache:
+    """
+    s3のkey一覧の取得結果（list_objects_v2のページ）を(bucket, prefix, delimiter)毎にキャッシュします
+    - ttl_sec秒以上経過したキャッシュは使用しません
+    - キャッシュ数がmax_entriesを超えた場合、もしくは全キャッシュのkeyの合計数がmax_total_keysを超えた場合、
+      最も長く使われていないものから削除します
+    - max_keys_per_entryを超えるkeyを含む一覧はメモリを圧迫しないようキャッシュしません
+    - キャッシュする一覧は呼び出し側が使用する項目（Key, Size, Prefix）のみに絞ったものとします（_iter_pagesを参照）
+    クラス変数として保持する為、Lambdaのコンテナが再利用される間（warm start）はキャッシュが有効です
+    """
+
+    def __init__(
+        self,
+        ttl_sec: float = 60,
+        max_entries: int = 64,
+        max_keys_per_entry: int = 50000,
+        max_total_keys: int = 100000,
+    ):
+        self.ttl_sec = ttl_sec
+        self.max_entries = max_entries
+        self.max_keys_per_entry = max_keys_per_entry
+        self.max_total_keys = max_total_keys
+        # key: (bucket, prefix, delimiter), value: (作成時刻, keyの数, ページのリスト)
+        self._entries: OrderedDict[tuple, tuple[float, int, list[dict]]] = OrderedDict()
+        self._total_keys = 0
+        self._lock = threading.Lock()
+
+    def get(self, bucket: str, prefix: str, delimiter: str | None) -> list[dict] | None:
+        key = (bucket, prefix, delimiter)
+        with self._lock:
+            if key not in self._entries:
+                return None
+            created, _, pages = self._entries[key]
+            if time.monotonic() - created > self.ttl_sec:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return pages
+
+    def put(
+        self, bucket: str, prefix: str, delimiter: str | None, pages: list[dict]
+    ) -> None:
+        key_count = sum(page.get("KeyCount", 0) for page in pages)
+        if key_count > min(self.max_keys_per_entry, self.max_total_keys):
+            return
+        key = (bucket, prefix, delimiter)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), key_count, pages)
+            self._total_keys += key_count
+            while (
+                len(self._entries) > self.max_entries
+                or self._total_keys > self.max_total_keys
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: tuple) -> None:
+        # self._lockを取得した状態で呼び出すこと
+        _, key_count, _ = self._entries.pop(key)
+        self._total_keys -= key_count
+
+    def invalidate(self, bucket: str, key_or_prefix: str) -> None:
+        """
+        key_or_prefixへの書き込みで結果が変わりうるキャッシュ
+        （key_or_prefixを含む一覧、およびkey_or_prefix以下の一覧）を削除します
+        """
+        with self._lock:
+            for key in list(self._entries):
+                cached_bucket, prefix, _ = key
+                if cached_bucket == bucket and (
+                    key_or_prefix.startswith(prefix) or prefix.startswith(key_or_prefix)
+                ):
+                    self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._total_keys = 0
+
+
 class S3Access:
-    s3_resource: S3ServiceResource = boto3.resource("s3")
-    s3_client: S3Client = boto3.client("s3")
+    # 複数ファイルを転送する際の並列数（boto3 clientのデフォルトの接続プール数に合わせる）
+    DEFAULT_MAX_WORKERS = 10
+    # 1ファイルの転送が失敗した場合に再試行する回数
+    DEFAULT_MAX_RETRY = 3
+    # ダウンロード・アップロード中のファイルの合計サイズの上限（512MBのLambdaを想定）
+    DEFAULT_MAX_INFLIGHT_BYTES = 128 * 1024 * 1024
+    # 全ての転送で共通に使用する設定
+    # multipart_threshold以上のサイズのファイルはmultipart_chunksize毎に分割して転送します
+    transfer_config = TransferConfig(
+        multipart_threshold=64 * 1024 * 1024,
+        multipart_chunksize=16 * 1024 * 1024,
+        max_concurrency=4,
+    )
+
+    # 同じprefixの一覧取得を繰り返さない為のキャッシュ（Noneにするとキャッシュしません）
+    listing_cache: ListingCache | None = ListingCache()
 
     def __init__(self, bucket: str, key: str = "", region: str = "ap-northeast-1"):
         self.bucket = bucket
         self.key = key
         self.region = region
 
+    @property
+    def s3_resource(self) -> S3ServiceResource:
+        return get_resource("s3")
+
+    @property
+    def s3_client(self) -> S3Client:
+        return get_client("s3")
+
     def _format_url(self, key: str, schema: str = "s3") -> str:
         if schema == "s3":
             return "s3://{}/{}".format(self.bucket, key)
@@ -346,16 +578,11 @@ class S3Access:
     def get_direct_child_folder_urls(self, schema: str = "s3") -> list:
         self._assert_key_is_folder("target")
 
-        result = self.s3_client.list_objects(
-            Bucket=self.bucket, Prefix=self.key, Delimiter="/"
-        )
-        if "CommonPrefixes" in result:
-            return [
-                self._format_url(common["Prefix"], schema)
-                for common in result["CommonPrefixes"]
-            ]
-        else:
-            return []
+        return [
+            self._format_url(common["Prefix"], schema)
+            for page in self._iter_pages(self.key, "/")
+            for common in page.get("CommonPrefixes", [])
+        ]
 
     def get_presigned_url(self, expire_sec: int = 3600) -> str:
         return self.s3_client.generate_presigned_url(
@@ -395,24 +622,49 @@ class S3Access:
         #   check_file_depthがNoneの場合はフォルダ深さに制限なくファイル（/以外でおわるキー）が存在する場合Trueを返す
         #
         # 実装上の注意：ファイル数が大量にある場合に関数のレスポンスが遅くならないように
+        # 　・一覧を全て取得せず、結果が確定した時点で打ち切る
+        # 　・check_file_depthを指定した場合は、Delimiterで必要な深さのフォルダのみを辿る
 
         self._assert_key_is_folder("target")
 
-        summaries = list(
-            self.s3_resource.Bucket(self.bucket).objects.filter(Prefix=self.key)
-        )
-        if len(summaries) == 0:
-            return False
+        if not check_any_file_exist:
+            if self.listing_cache is not None:
+                for delimiter in [None, "/"]:
+                    pages = self.listing_cache.get(self.bucket, self.key, delimiter)
+                    if pages is not None:
+                        return any(page.get("KeyCount", 0) > 0 for page in pages)
 
-        if check_any_file_exist:
-            for summary in summaries:
-                depth = len(summary.key[len(self.key) :].split("/"))
-                if not summary.key.endswith("/"):
-                    if check_file_depth is None or depth == check_file_depth:
-                        return True
+            result = self.s3_client.list_objects_v2(
+                Bucket=self.bucket, Prefix=self.key, MaxKeys=1
+            )
+            return result.get("KeyCount", 0) > 0
+
+        if check_file_depth is None:
+            for summary in self._iter_objects(self.key):
+                if not summary["Key"].endswith("/"):
+                    return True
             return False
         else:
-            return True
+            return self._exist_file_at_depth(self.key, check_file_depth)
+
+    def _exist_file_at_depth(self, prefix: str, depth: int) -> bool:
+        """
+        prefixのフォルダから深さdepth（1の場合フォルダ直下）にファイルが存在するかを調べます
+        Delimiter="/"で1階層ずつ辿り、ファイルが見つかった時点で打ち切ります
+        """
+        if depth < 1:
+            return False
+
+        for page in self._iter_pages(prefix, "/"):
+            if depth == 1:
+                for summary in page.get("Contents", []):
+                    if not summary["Key"].endswith("/"):
+                        return True
+            else:
+                for common in page.get("CommonPrefixes", []):
+                    if self._exist_file_at_depth(common["Prefix"], depth - 1):
+                        return True
+        return False
 
     def copy_to(
         self,
@@ -428,6 +680,7 @@ class S3Access:
                 "Key": self.key,
             }
         )
+        dest._invalidate_listing_cache(dest.key)
 
     def copy_children_to(
         self,
@@ -436,9 +689,19 @@ class S3Access:
         copy_src_folder_name: bool = True,
         extension_list: list | None = None,
         direct_children_only: bool = False,
-    ) -> int:
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_retry: int = DEFAULT_MAX_RETRY,
+        return_report: bool = False,
+    ) -> int | TransferReport:
         """
         このS3Accessが表すkeyのフォルダ内のファイルを引数で指定する別のs3へコピーします
+        - コピーはs3上で行われ（ファイルをダウンロードしない）、max_workersの並列数で実行します
+        - フォルダ内のファイル一覧はページ単位で取得しながら順次コピーを開始します
+        - transfer_config.multipart_threshold以上のサイズのファイルはmultipartでコピーします
+        - コピーに失敗したファイルはmax_retry回まで再試行します
+
+        return_reportがFalseの場合、コピーしたファイル数を返します（失敗したファイルがあれば例外をスローします）
+        return_reportがTrueの場合、コピー結果をTransferReportとして返します
         """
 
         self._assert_key_is_folder("s3 copy source")
@@ -448,28 +711,166 @@ class S3Access:
         if copy_src_folder_name:
             omit_key_length -= len(self.key.split("/")[-2]) + 1
 
-        cnt = 0
-        for summary in self.s3_resource.Bucket(self.bucket).objects.filter(
-            Prefix=self.key
-        ):
-            if summary.key == self.key:
-                continue
-            if (
-                direct_children_only
-                and len(summary.key[len(self.key) :].split("/")) > 1
-            ):
-                continue
-
-            if extension_list is None or summary.key.split(".")[-1] in extension_list:
-                dest_file_key = dest.key + summary.key[omit_key_length:]
-                self.s3_resource.Object(dest.bucket, dest_file_key).copy(
-                    {
-                        "Bucket": self.bucket,
-                        "Key": summary.key,
-                    }
+        report = TransferReport()
+
+        def iter_tasks():
+            for summary in self._iter_objects(self.key):
+                key, size = summary["Key"], summary["Size"]
+                if key == self.key:
+                    continue
+                if direct_children_only and len(key[len(self.key) :].split("/")) > 1:
+                    report.add_skipped(key, size)
+                    continue
+                if (
+                    extension_list is not None
+                    and key.split(".")[-1] not in extension_list
+                ):
+                    report.add_skipped(key, size)
+                    continue
+
+                dest_file_key = dest.key + key[omit_key_length:]
+                yield key, size, partial(
+                    self._copy_object, key, size, dest.bucket, dest_file_key
                 )
-                cnt += 1
-        return cnt
+
+        self._run_transfer_tasks(
+            iter_tasks(), report, max_workers=max_workers, max_retry=max_retry
+        )
+        dest._invalidate_listing_cache(dest.key)
+        return self._resolve_transfer_result(report, "copy", return_report)
+
+    def _copy_object(
+        self, src_key: str, size: int, dest_bucket: str, dest_key: str
+    ) -> None:
+        copy_source = {"Bucket": self.bucket, "Key": src_key}
+        if size < self.transfer_config.multipart_threshold:
+            self.s3_client.copy_object(
+                CopySource=copy_source, Bucket=dest_bucket, Key=dest_key
+            )
+        else:
+            self.s3_client.copy(
+                copy_source, dest_bucket, dest_key, Config=self.transfer_config
+            )
+
+    def _iter_objects(self, prefix: str) -> Iterator[dict]:
+        """
+        prefixで始まるkeyのオブジェクト情報（Key, Size）を1ページ（最大1000件）ずつ取得しながら返します
+        """
+        for page in self._iter_pages(prefix):
+            for summary in page.get("Contents", []):
+                yield summary
+
+    def _iter_pages(self, prefix: str, delimiter: str | None = None) -> Iterator[dict]:
+        """
+        list_objects_v2の結果を1ページずつ返します
+        listing_cacheにキャッシュがあればs3にアクセスせずにキャッシュを返します
+        最後のページまで読み進めた場合のみ、取得した結果をキャッシュします
+        """
+        if self.listing_cache is not None:
+            pages = self.listing_cache.get(self.bucket, prefix, delimiter)
+            if pages is not None:
+                yield from pages
+                return
+
+        kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+        if delimiter is not None:
+            kwargs["Delimiter"] = delimiter
+
+        pages = []
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(**kwargs):
+            # キャッシュのメモリを抑える為、呼び出し側が使用する項目のみを残す
+            page = {
+                "KeyCount": page.get("KeyCount", 0),
+                "Contents": [
+                    {"Key": summary["Key"], "Size": summary["Size"]}
+                    for summary in page.get("Contents", [])
+                ],
+                "CommonPrefixes": [
+                    {"Prefix": common["Prefix"]}
+                    for common in page.get("CommonPrefixes", [])
+                ],
+            }
+            pages.append(page)
+            yield page
+
+        if self.listing_cache is not None:
+            self.listing_cache.put(self.bucket, prefix, delimiter, pages)
+
+    def _invalidate_listing_cache(self, key_or_prefix: str) -> None:
+        if self.listing_cache is not None:
+            self.listing_cache.invalidate(self.bucket, key_or_prefix)
+
+    @staticmethod
+    def _run_transfer_tasks(
+        task_iter: Iterator[tuple[str, int, Callable[[], None]]],
+        report: TransferReport,
+        *,
+        max_workers: int,
+        max_retry: int,
+        max_inflight_bytes: int | None = None,
+    ) -> None:
+        """
+        task_iterが返す(key, size, 転送処理)をmax_workersの並列数で実行し、結果をreportに記録します
+        実行中のタスクがmax_workersに達している間、もしくは実行中のタスクの合計sizeが
+        max_inflight_bytesを超える間はtask_iterを読み進めません
+        （1つのタスクのsizeがmax_inflight_bytesを超える場合は、そのタスクのみを実行します）
+        """
+
+        def run(func: Callable[[], None]) -> None:
+            for retry in range(max_retry + 1):
+                try:
+                    func()
+                    return
+                except Exception:
+                    if retry == max_retry:
+                        raise
+                    time.sleep(0.1 * 2**retry)
+
+        def collect(done: set[Future]) -> None:
+            for future in done:
+                key, size = pending.pop(future)
+                ex = future.exception()
+                if ex is None:
+                    report.add_transferred(key, size)
+                else:
+                    report.add_failed(key, size, ex)
+
+        def is_full(next_size: int) -> bool:
+            if len(pending) >= max_workers:
+                return True
+            if max_inflight_bytes is None or len(pending) == 0:
+                return False
+            inflight_bytes = sum(size for _, size in pending.values())
+            return inflight_bytes + next_size > max_inflight_bytes
+
+        pending: dict[Future, tuple[str, int]] = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for key, size, func in task_iter:
+                while is_full(size):
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+                pending[executor.submit(run, func)] = (key, size)
+            done, _ = wait(pending)
+            collect(done)
+        report.finish()
+
+    @staticmethod
+    def _resolve_transfer_result(
+        report: TransferReport, action: str, return_report: bool
+    ) -> int | TransferReport:
+        print("{} result: {}".format(action, report.to_dict()))
+        if return_report:
+            return report
+        if len(report.failed_keys) > 0:
+            raise WebApiException(
+                500,
+                ErrorCode.ServerLogicError,
+                "failed to {} {} files: {}".format(
+                    action, len(report.failed_keys), report.failed_keys
+                ),
+            )
+        return len(report.transferred_keys)
 
     def download_children(
         self,
@@ -477,9 +878,21 @@ class S3Access:
         *,
         copy_src_folder_name: bool = True,
         extension_list: list | None = None,
-    ) -> int:
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_retry: int = DEFAULT_MAX_RETRY,
+        max_inflight_bytes: int | None = DEFAULT_MAX_INFLIGHT_BYTES,
+        transfer_config: TransferConfig | None = None,
+        return_report: bool = False,
+    ) -> int | TransferReport:
         """
         このS3Accessが表すkeyのフォルダ内のファイルを引数で指定するパスへダウンロードします
+        - max_workersの並列数でダウンロードします
+        - ダウンロード中のファイルの合計サイズがmax_inflight_bytesを超えないように並列数を抑えます
+          （/tmpやメモリの使用量を抑える為。Noneの場合は制限しません）
+        - transfer_configを指定しない場合はS3Access.transfer_configを使用します
+
+        return_reportがFalseの場合、ダウンロードしたファイル数を返します（失敗したファイルがあれば例外をスローします）
+        return_reportがTrueの場合、ダウンロード結果をTransferReportとして返します
         """
 
         self._assert_key_is_folder("s3 copy source")
@@ -492,18 +905,43 @@ class S3Access:
         if copy_src_folder_name:
             omit_key_length -= len(self.key.split("/")[-2]) + 1
 
-        cnt = 0
-        for summary in self.s3_resource.Bucket(self.bucket).objects.filter(
-            Prefix=self.key
-        ):
-            if summary.key.endswith("/"):
-                continue
-            if extension_list is None or summary.key.split(".")[-1] in extension_list:
-                self.s3_resource.Object(self.bucket, summary.key).download_file(
-                    dest_dir_path + summary.key[omit_key_length:]
+        report = TransferReport()
+
+        def iter_tasks():
+            for summary in self._iter_objects(self.key):
+                key, size = summary["Key"], summary["Size"]
+                if key.endswith("/"):
+                    continue
+                if (
+                    extension_list is not None
+                    and key.split(".")[-1] not in extension_list
+                ):
+                    report.add_skipped(key, size)
+                    continue
+
+                yield key, size, partial(
+                    self._download_object,
+                    key,
+                    dest_dir_path + key[omit_key_length:],
+                    transfer_config or self.transfer_config,
                 )
-                cnt += 1
-        return cnt
+
+        self._run_transfer_tasks(
+            iter_tasks(),
+            report,
+            max_workers=max_workers,
+            max_retry=max_retry,
+            max_inflight_bytes=max_inflight_bytes,
+        )
+        return self._resolve_transfer_result(report, "download", return_report)
+
+    def _download_object(
+        self, key: str, dest_file_path: str, transfer_config: TransferConfig
+    ) -> None:
+        os.makedirs(os.path.dirname(dest_file_path), exist_ok=True)
+        self.s3_client.download_file(
+            self.bucket, key, dest_file_path, Config=transfer_config
+        )
 
     def download_file(self, dest_file_path: str):
         """
@@ -519,9 +957,21 @@ class S3Access:
         *,
         extension_list: list | None = None,
         delete_after_uploaded: bool = False,
-    ) -> int:
+        recursive: bool = False,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_retry: int = DEFAULT_MAX_RETRY,
+        max_inflight_bytes: int | None = DEFAULT_MAX_INFLIGHT_BYTES,
+        transfer_config: TransferConfig | None = None,
+        return_report: bool = False,
+    ) -> int | TransferReport:
         """
         このS3Accessが表すkeyのフォルダへ引数で指定するパスのフォルダ以下のファイルをアップロードします
+        - recursiveがFalseの場合、フォルダ直下のファイルのみアップロードします
+        - recursiveがTrueの場合、サブフォルダ以下のファイルもフォルダ構成を保ったままアップロードします
+        - max_workers・max_inflight_bytes・transfer_configの扱いはdownload_childrenと同じです
+
+        return_reportがFalseの場合、アップロードしたファイル数を返します（失敗したファイルがあれば例外をスローします）
+        return_reportがTrueの場合、アップロード結果をTransferReportとして返します
         """
 
         self._assert_key_is_folder("s3 copy destination")
@@ -529,17 +979,60 @@ class S3Access:
         if not src_dir_path.endswith("/"):
             src_dir_path += "/"
 
-        cnt = 0
-        for path in glob("{}*".format(src_dir_path)):
-            if extension_list is None or path.split(".")[-1] in extension_list:
-                self.s3_resource.Bucket(self.bucket).upload_file(
-                    path, Key="{}{}".format(self.key, os.path.basename(path))
+        report = TransferReport()
+
+        def iter_paths():
+            if recursive:
+                for dir_path, dir_names, file_names in os.walk(src_dir_path):
+                    dir_names.sort()
+                    for file_name in sorted(file_names):
+                        yield os.path.join(dir_path, file_name)
+            else:
+                for path in glob("{}*".format(src_dir_path)):
+                    if os.path.isfile(path):
+                        yield path
+
+        def iter_tasks():
+            for path in iter_paths():
+                size = os.path.getsize(path)
+                if (
+                    extension_list is not None
+                    and path.split(".")[-1] not in extension_list
+                ):
+                    report.add_skipped(path, size)
+                    continue
+
+                rel_path = os.path.relpath(path, src_dir_path).replace(os.sep, "/")
+                yield path, size, partial(
+                    self._upload_object,
+                    path,
+                    self.key + rel_path,
+                    transfer_config or self.transfer_config,
+                    delete_after_uploaded,
                 )
-                cnt += 1
-                if delete_after_uploaded:
-                    os.remove(path)
 
-        return cnt
+        self._run_transfer_tasks(
+            iter_tasks(),
+            report,
+            max_workers=max_workers,
+            max_retry=max_retry,
+            max_inflight_bytes=max_inflight_bytes,
+        )
+        self._invalidate_listing_cache(self.key)
+        return self._resolve_transfer_result(report, "upload", return_report)
+
+    def _upload_object(
+        self,
+        src_file_path: str,
+        key: str,
+        transfer_config: TransferConfig,
+        delete_after_uploaded: bool,
+    ) -> None:
+        self.s3_client.upload_file(
+            src_file_path, self.bucket, key, Config=transfer_config
+        )
+        if delete_after_uploaded:
+            os.remove(src_file_path)
 
     def upload_one(
         self,
@@ -554,13 +1047,15 @@ class S3Access:
 
         self._assert_key_is_folder("s3 copy destination")
 
+        key = "{}{}".format(self.key, os.path.basename(src_file_path))
         self.s3_resource.Bucket(self.bucket).upload_file(
             src_file_path,
-            Key="{}{}".format(self.key, os.path.basename(src_file_path)),
+            Key=key,
             ExtraArgs=(
                 {"ContentType": content_type} if content_type is not None else None
             ),
         )
+        self._invalidate_listing_cache(key)
         if delete_after_uploaded:
             os.remove(src_file_path)
 
@@ -586,11 +1081,9 @@ class S3Access:
         self._assert_key_is_folder("serach target")
 
         key_list = []
-        for summary in self.s3_resource.Bucket(self.bucket).objects.filter(
-            Prefix=self.key
-        ):
-            if summary.key.split(".")[-1] in ext_list:
-                key_list.append(summary.key)
+        for summary in self._iter_objects(self.key):
+            if summary["Key"].split(".")[-1] in ext_list:
+                key_list.append(summary["Key"])
 
         if len(key_list) == 0:
             if raise_if_not_exist:
@@ -664,53 +1157,259 @@ class SqsAccess:
         )
         self.queue_url = "{}/{}/{}".format(
             self.endpoint_url,
-            (
-                account
-                if account is not None
-                else boto3.client("sts").get_caller_identity()["Account"]
-            ),
+            account if account is not None else get_account_id(),
             queue_name,
         )
-        self.client = boto3.client("sqs", endpoint_url=self.endpoint_url)
+        self.client = get_client("sqs", endpoint_url=self.endpoint_url)
+
+    # send_message_batchの制約（1回あたりのメッセージ数と合計サイズの上限）
+    MAX_BATCH_ENTRIES = 10
+    MAX_BATCH_BYTES = 256 * 1024
+    DEFAULT_MAX_WORKERS = 10
+    DEFAULT_MAX_RETRY = 3
 
     def send_json_message(self, message_dict: dict) -> dict:
         return self.client.send_message(
             QueueUrl=self.queue_url, MessageBody=json.dumps(message_dict)
         )
 
+    def send_json_messages(
+        self,
+        message_dict_list: list[dict],
+        *,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        max_retry: int = DEFAULT_MAX_RETRY,
+    ) -> list[dict]:
+        """
+        複数のメッセージをsend_message_batchでまとめて送信します
+        - メッセージを10件かつ256KB以内のバッチに詰め、max_workersの並列数で送信します
+        - 送信に失敗したメッセージのみをmax_retry回まで再送します
+          （メッセージ自体に問題がある（SenderFaultがTrue）場合は再送しません）
+
+        message_dict_listと同じ順序で、メッセージ毎の送信結果を返します
+        - 成功した場合：{"Id", "MessageId", "MD5OfMessageBody", ...}
+        - 失敗した場合：{"Id", "SenderFault", "Code", "Message"}
+        """
+
+        result_list: list[dict | None] = [None] * len(message_dict_list)
+        batch_list: list[list[dict]] = []
+        batch: list[dict] = []
+        batch_bytes = 0
+        for i, message_dict in enumerate(message_dict_list):
+            body = json.dumps(message_dict)
+            body_bytes = len(body.encode("utf-8"))
+            if body_bytes > self.MAX_BATCH_BYTES:
+                result_list[i] = {
+                    "Id": str(i),
+                    "SenderFault": True,
+                    "Code": "MessageTooLong",
+                    "Message": "message size {} exceeds {} bytes".format(
+                        body_bytes, self.MAX_BATCH_BYTES
+                    ),
+                }
+                continue
+            if (
+                len(batch) >= self.MAX_BATCH_ENTRIES
+                or batch_bytes + body_bytes > self.MAX_BATCH_BYTES
+            ):
+                batch_list.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append({"Id": str(i), "MessageBody": body})
+            batch_bytes += body_bytes
+        if len(batch) > 0:
+            batch_list.append(batch)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for entry_result_list in executor.map(
+                lambda batch: self._send_batch(batch, max_retry), batch_list
+            ):
+                for entry_result in entry_result_list:
+                    result_list[int(entry_result["Id"])] = entry_result
+
+        return result_list
+
+    def _send_batch(self, entry_list: list[dict], max_retry: int) -> list[dict]:
+        result_list = []
+        for retry in range(max_retry + 1):
+            try:
+                response = self.client.send_message_batch(
+                    QueueUrl=self.queue_url, Entries=entry_list
+                )
+            except Exception as ex:
+                if retry == max_retry:
+                    return result_list + [
+                        {
+                            "Id": entry["Id"],
+                            "SenderFault": False,
+                            "Code": type(ex).__name__,
+                            "Message": str(ex),
+                        }
+                        for entry in entry_list
+                    ]
+                time.sleep(0.1 * 2**retry)
+                continue
+
+            result_list += response.get("Successful", [])
+            retry_id_set = set()
+            for failed in response.get("Failed", []):
+                if failed["SenderFault"] or retry == max_retry:
+                    result_list.append(failed)
+                else:
+                    retry_id_set.add(failed["Id"])
+
+            entry_list = [entry for entry in entry_list if entry["Id"] in retry_id_set]
+            if len(entry_list) == 0:
+                break
+            time.sleep(0.1 * 2**retry)
+        return result_list
+
 
 class LambdaAccess:
+    DEFAULT_MAX_CONCURRENCY = 10
+    # invoke_manyでtimeout_secを指定した場合のclientの設定（期限を過ぎた呼び出しを再試行しない）
+    NO_RETRY_CONFIG = {"read_timeout": 900, "retries": {"total_max_attempts": 1}}
+
     def __init__(
         self, lambda_name: str, account: str | None = None, region: str | None = None
     ):
-        self.client = boto3.client("lambda")
+        self.client = get_client("lambda")
         self.func_arn = "arn:aws:lambda:{}:{}:function:{}".format(
             region if region is not None else os.environ["AWS_REGION"],
-            (
-                account
-                if account is not None
-                else boto3.client("sts").get_caller_identity()["Account"]
-            ),
+            account if account is not None else get_account_id(),
             lambda_name,
         )
 
-    def invoke(self, *, body_dict: dict | None = None, query_dict: dict | None = None):
+    def invoke(
+        self,
+        *,
+        body_dict: dict | None = None,
+        query_dict: dict | None = None,
+        log_tail: bool = False,
+    ):
+        """
+        lambdaを同期的に呼び出し、その戻り値を返します
+        log_tailがTrueの場合、呼び出したlambdaのログの末尾（最大4KB）を取得しprintします
+        """
+        return self._invoke(
+            self.client,
+            self._create_payload(body_dict, query_dict),
+            log_tail=log_tail,
+        )
+
+    def invoke_async(
+        self, *, body_dict: dict | None = None, query_dict: dict | None = None
+    ) -> int:
+        """
+        lambdaを非同期に（InvocationType="Event"で）呼び出します
+        呼び出したlambdaの終了を待たずに戻ります（戻り値はステータスコードで、受付成功時は202）
+        """
+        return self._invoke(
+            self.client,
+            self._create_payload(body_dict, query_dict),
+            asynchronous=True,
+        )
+
+    def invoke_many(
+        self,
+        kwargs_list: list[dict],
+        *,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        timeout_sec: float | None = None,
+        return_exceptions: bool = False,
+        asynchronous: bool = False,
+        log_tail: bool = False,
+    ) -> list:
+        """
+        invokeを並列に実行し、kwargs_listと同じ順序で結果を返します
+        - kwargs_listの各要素はinvokeのキーワード引数（body_dict, query_dict）の辞書です
+        - 同時に実行する数はmax_concurrencyまでに制限します
+        - timeout_secを指定した場合、timeout_sec秒以内に応答しない呼び出しは（再試行せず）TimeoutErrorで失敗とします
+          （応答を待たずに戻るため、失敗とした呼び出しが呼び出し先で実行されている場合があります）
+        - return_exceptionsがTrueの場合、失敗した呼び出しの結果として例外を返します
+          Falseの場合、全ての呼び出しが終わった後に、最初に失敗した呼び出しの例外をスローします
+        - asynchronousがTrueの場合、invoke_asyncで呼び出します（結果はステータスコードになります）
+        - log_tailはinvokeと同じです（asynchronousがTrueの場合は無視します）
+        """
+        # timeout_secは呼び出し全体の期限としてwaitで判定する
+        # （clientの設定にすると呼び出し毎に別のclientが作成・保持されてしまうため、clientは固定の設定で使い回す）
+        client = (
+            self.client
+            if timeout_sec is None
+            else get_client("lambda", config_dict=self.NO_RETRY_CONFIG)
+        )
+
+        def invoke_safely(kwargs: dict) -> Any:
+            try:
+                return self._invoke(
+                    client,
+                    self._create_payload(**kwargs),
+                    asynchronous=asynchronous,
+                    log_tail=log_tail,
+                )
+            except Exception as ex:
+                return ex
+
+        executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        future_list = [executor.submit(invoke_safely, kwargs) for kwargs in kwargs_list]
+        wait(future_list, timeout=timeout_sec)
+        # 期限までに終わらなかった呼び出しは待たずに失敗とする（未開始の呼び出しは取り消す）
+        executor.shutdown(wait=False, cancel_futures=True)
+        result_list = [
+            (
+                future.result()
+                if future.done() and not future.cancelled()
+                else TimeoutError(
+                    f"invoke {self.func_arn} did not finish in {timeout_sec} sec"
+                )
+            )
+            for future in future_list
+        ]
+
+        if not return_exceptions:
+            for result in result_list:
+                if isinstance(result, Exception):
+                    raise result
+        return result_list
+
+    @staticmethod
+    def _create_payload(
+        body_dict: dict | None = None, query_dict: dict | None = None
+    ) -> dict:
         payload = {}
         if body_dict is not None:
             payload["body"] = json.dumps(body_dict)
         if query_dict is not None:
             payload["queryStringParameters"] = query_dict
+        return payload
 
-        response = self.client.invoke(
+    def _invoke(
+        self,
+        client,
+        payload: dict,
+        *,
+        asynchronous: bool = False,
+        log_tail: bool = False,
+    ) -> Any:
+        if asynchronous:
+            response = client.invoke(
+                FunctionName=self.func_arn,
+                InvocationType="Event",
+                Payload=json.dumps(payload),
+            )
+            return response["StatusCode"]
+
+        response = client.invoke(
             FunctionName=self.func_arn,
             InvocationType="RequestResponse",
-            LogType="Tail",
+            LogType="Tail" if log_tail else "None",
             Payload=json.dumps(payload),
         )
+        if log_tail and "LogResult" in response:
+            print(base64.b64decode(response["LogResult"]).decode("utf-8", "replace"))
 
         return json.load(response["Payload"])
 
-    [staticmethod]
+    @staticmethod
     def from_default(func_name: str) -> LambdaAccess:
         api_name = os.environ["API"]
         branch = os.environ["Branch"]
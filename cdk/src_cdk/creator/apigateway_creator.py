@@ -1,4 +1,6 @@
 from __future__ import annotations
+import re
+
 from aws_cdk import Stack
 from aws_cdk.aws_apigatewayv2 import (
     CfnApi,
@@ -48,6 +50,59 @@ class CognitoRef:
         )
 
 
+class RoutePlan:
+    """
+    apigwのルートの計画
+    - 同じメソッド・パス（パスパラメータの名前は区別しない）のルートが複数のlambdaに設定されていないかをチェックします
+    - 同じlambdaに同じルートが重複して設定されている場合は1つにまとめます
+    """
+
+    PATH_PARAM_PATTERN = re.compile(r"\{[^}/]+?(\+?)\}")
+
+    def __init__(self):
+        # 正規化したルート -> (lambda_key, 元のルート, authorizer名)
+        self.route_dict: dict[tuple[str, str], tuple[str, str, str | None]] = {}
+
+    @classmethod
+    def normalize_route_key(cls, route_key: str) -> tuple[str, str]:
+        if route_key == "$default":
+            return ("$default", "")
+        method, path = route_key.split(" ", 1)
+        path = path.strip()
+        if len(path) > 1:
+            path = path.rstrip("/")
+        return (method.upper(), cls.PATH_PARAM_PATTERN.sub(r"{\1}", path))
+
+    def add(self, lambda_key: str, route_key: str, authorizer_name: str | None):
+        key = self.normalize_route_key(route_key)
+        if key in self.route_dict:
+            other_lambda_key, other_route_key, other_authorizer_name = self.route_dict[
+                key
+            ]
+            if (
+                other_lambda_key == lambda_key
+                and other_authorizer_name == authorizer_name
+            ):
+                # 同じlambdaに同じルートが重複して設定されている
+                return
+            raise Exception(
+                "route '{}' of lambda '{}' conflicts with route '{}' of lambda '{}'".format(
+                    route_key, lambda_key, other_route_key, other_lambda_key
+                )
+            )
+        self.route_dict[key] = (lambda_key, route_key, authorizer_name)
+
+    def get_route_list(self, lambda_key: str) -> list[tuple[str, str | None]]:
+        """
+        lambda_keyに設定する(ルート, authorizer名)のリストを返します
+        """
+        return [
+            (route_key, authorizer_name)
+            for _lambda_key, route_key, authorizer_name in self.route_dict.values()
+            if _lambda_key == lambda_key
+        ]
+
+
 class ApiGatewayCreator:
     ##############################################
     STAGE_VARIABLE_BRANCH = "branch"
@@ -123,10 +178,19 @@ class ApiGatewayCreator:
         lambda_integration_spec: dict[str, dict],
         *,
         cognito: CognitoRef | None = None,
+        alias_name_dict: dict[str, str] | None = None,
     ) -> ApiGatewayCreator:
+        """
+        alias_name_dictで指定したlambda_keyのlambdaは、指定したエイリアスを呼び出すように設定します
+        """
+        if alias_name_dict is None:
+            alias_name_dict = {}
 
-        authorizer_dict = {}
-        for route_spec in lambda_integration_spec.values():
+        # 全てのルートを計画し、衝突するルートが無いかをsynth時にチェックする
+        authorizer_dict: dict[str, CfnAuthorizer] = {}
+        plan = RoutePlan()
+        for lambda_key, route_spec in lambda_integration_spec.items():
+            authorizer_name = None
             if "cognito_auth" in route_spec:
                 assert cognito is not None
                 auth_spec = route_spec["cognito_auth"]
@@ -141,21 +205,21 @@ class ApiGatewayCreator:
                         identity_source=["$request.header.Authorization"],
                         jwt_configuration=cognito.get_jwt_configuration(auth_spec),
                     )
+            for route_key in route_spec["route"]:
+                plan.add(lambda_key, route_key, authorizer_name)
 
-        for lambda_key, route_spec in lambda_integration_spec.items():
-
+        # ルートが1つも無いlambdaにはintegrationを作成しない
+        for lambda_key in lambda_integration_spec:
+            route_list = plan.get_route_list(lambda_key)
+            if len(route_list) == 0:
+                continue
             self._create_lambda_integration(
                 self.solver.get_lambda_name(
                     lambda_key, "${stageVariables." + self.STAGE_VARIABLE_BRANCH + "}"
                 ),  # stage変数を参照して決まるlambda名
-                route_spec["route"],
-                (
-                    authorizer_dict[
-                        cognito.get_authorizer_name(route_spec["cognito_auth"])
-                    ]
-                    if "cognito_auth" in route_spec
-                    else None
-                ),
+                route_list,
+                authorizer_dict,
+                alias_name=alias_name_dict.get(lambda_key),
             )
         return self
 
@@ -198,22 +262,31 @@ class ApiGatewayCreator:
     def _create_lambda_integration(
         self,
         lambda_name: str,
-        route_key_list: list[str],
-        authorizer: CfnAuthorizer | None = None,
-    ) -> None:
+        route_list: list[tuple[str, str | None]],
+        authorizer_dict: dict[str, CfnAuthorizer],
+        alias_name: str | None = None,
+    ) -> CfnIntegration:
 
         integration = CfnIntegration(
             self.scope,
             f"{lambda_name}-integration",
             api_id=self.api.ref,
             integration_type="AWS_PROXY",
-            integration_uri="arn:aws:lambda:{}:{}:function:{}".format(
-                self.scope.region, self.scope.account, lambda_name
+            integration_uri="arn:aws:lambda:{}:{}:function:{}{}".format(
+                self.scope.region,
+                self.scope.account,
+                lambda_name,
+                f":{alias_name}" if alias_name is not None else "",
             ),
             integration_method="GET",
             payload_format_version="2.0",
         )
-        for route_key in route_key_list:
+        for route_key, authorizer_name in route_list:
+            authorizer = (
+                authorizer_dict[authorizer_name]
+                if authorizer_name is not None
+                else None
+            )
             CfnRoute(
                 self.scope,
                 "{}:{}".format(lambda_name, route_key),
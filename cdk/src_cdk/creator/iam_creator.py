@@ -13,6 +13,8 @@ from aws_cdk.aws_iam import (
 )
 from aws_cdk.aws_cognito import CfnIdentityPool
 
+from ..template_util import Template
+
 
 class IAMCreator:
     def __init__(
@@ -95,16 +97,20 @@ class IAMCreator:
         policy定義ファイル中の下記は文字列置換されます
         - {$account}: AWSアカウント名で置換します
         - {$region}: AWSリージョン名で置換します
-        - {$service}: 引数で指定するservice_nameで置換します
+        - {$service}, {$service_name}: 引数で指定するservice_nameで置換します
         - {$branch}: 引数で指定するbranch_nameで置換します
+        上記以外の{$...}が含まれる場合はエラーになります
         """
 
-        with open(json_path) as f:
-            text = f.read()
-            replaced_text = (
-                text.replace("{$service}", service_name)
-                .replace("{$branch}", branch_name)
-                .replace("{$account}", env["account"])
-                .replace("{$region}", env["region"])
+        return json.loads(
+            Template.render_file(
+                json_path,
+                {
+                    "service": service_name,
+                    "service_name": service_name,
+                    "branch": branch_name,
+                    "account": env["account"],
+                    "region": env["region"],
+                },
             )
-            return json.loads(replaced_text)
+        )
@@ -3,7 +3,16 @@ import json
 
 from aws_cdk import Duration, Size, Stack
 from aws_cdk.aws_iam import ManagedPolicy, ServicePrincipal, PolicyDocument, Policy
-from aws_cdk.aws_lambda import Code, FileSystem, Function, Runtime
+from aws_cdk.aws_lambda import (
+    Alias,
+    Architecture,
+    Code,
+    FileSystem,
+    Function,
+    IFunction,
+    Runtime,
+    SnapStartConf,
+)
 from aws_cdk.aws_eventschemas import CfnSchema
 from aws_cdk.aws_lambda_event_sources import SqsEventSource, SnsEventSource
 from aws_cdk.aws_sqs import Queue
@@ -11,6 +20,13 @@ from aws_cdk.aws_sns import Topic
 
 
 class LambdaCreator:
+    ##############################################
+    # provisioned_concurrency/snap_startを使用する場合に作成するエイリアス名
+    ALIAS_NAME = "live"
+    # snap_startを使用できるpythonの最小version
+    SNAP_START_MIN_PYTHON_VERSION = (3, 12)
+    ##############################################
+
     def __init__(
         self,
         scope: Stack,
@@ -29,13 +45,30 @@ class LambdaCreator:
         efs_arn: str | None = None,
         efs_mount_path: str | None = "/mnt/efs",
         test_schema_path: str | None = None,
+        architecture: str | None = None,
+        reserved_concurrency: int | None = None,
+        provisioned_concurrency: int | None = None,
+        snap_start: bool | None = None,
     ) -> None:
+        """
+        parameters:
+          architecture: "arm64"もしくは"x86_64"。Noneの場合はx86_64
+          reserved_concurrency: このlambdaの同時実行数の上限（予約）
+          provisioned_concurrency: 初期化済みで待機させておく実行環境の数
+          snap_start: Trueの場合、初期化済みの実行環境のスナップショットから起動します（python3.12以上）
+                      provisioned_concurrencyと同時には指定できません
+          ※provisioned_concurrencyかsnap_startを指定した場合、公開したバージョンを指すエイリアス（ALIAS_NAME）を作成し、
+          　API gateway/sqs/snsからはエイリアスを呼び出します
+        """
         self.scope = scope
         self.lambda_name = lambda_name
+        runtime = runtime if runtime is not None else Runtime.PYTHON_3_12
+        if snap_start:
+            self._check_snap_start(lambda_name, runtime, provisioned_concurrency)
 
         self.func = self._create(
             lambda_name,
-            runtime if runtime is not None else Runtime.PYTHON_3_12,
+            runtime,
             (
                 inline_policy_json_path_list
                 if inline_policy_json_path_list is not None
@@ -55,8 +88,67 @@ class LambdaCreator:
                 else None
             ),
             test_schema_path=test_schema_path,
+            architecture=architecture,
+            reserved_concurrency=reserved_concurrency,
+            snap_start=snap_start,
+        )
+        self.alias = (
+            Alias(
+                self.scope,
+                f"{lambda_name}-{self.ALIAS_NAME}",
+                alias_name=self.ALIAS_NAME,
+                version=self.func.current_version,
+                provisioned_concurrent_executions=provisioned_concurrency,
+            )
+            if self.get_alias_name(provisioned_concurrency, snap_start) is not None
+            else None
         )
 
+    @classmethod
+    def _check_snap_start(
+        cls,
+        lambda_name: str,
+        runtime: Runtime,
+        provisioned_concurrency: int | None,
+    ):
+        """
+        snap_startを使用できない設定の場合は（deploy時ではなく）synth時に例外をスローします
+        """
+        if provisioned_concurrency:
+            raise Exception(
+                f"lambda '{lambda_name}': snap_start cannot be used with provisioned_concurrency"
+            )
+        if runtime.name.startswith("python"):
+            version = tuple(int(v) for v in runtime.name[len("python") :].split("."))
+            if version < cls.SNAP_START_MIN_PYTHON_VERSION:
+                raise Exception(
+                    "lambda '{}': snap_start requires python{} or later (runtime: {})".format(
+                        lambda_name,
+                        ".".join(str(v) for v in cls.SNAP_START_MIN_PYTHON_VERSION),
+                        runtime.name,
+                    )
+                )
+
+    @classmethod
+    def get_alias_name(
+        cls,
+        provisioned_concurrency: int | None = None,
+        snap_start: bool | None = None,
+    ) -> str | None:
+        """
+        呼び出し元（API gateway等）が呼び出すべきエイリアス名を返します（エイリアスを作成しない場合はNone）
+        """
+        if provisioned_concurrency or snap_start:
+            return cls.ALIAS_NAME
+        return None
+
+    @property
+    def target(self) -> IFunction:
+        """
+        呼び出し元から呼び出す対象（エイリアスを作成した場合はエイリアス）
+        """
+        return self.alias if self.alias is not None else self.func
+
     def _create(
         self,
         lambda_name: str,
@@ -73,6 +165,9 @@ class LambdaCreator:
         env_dict: dict | None = None,
         filesystem: FileSystem | None = None,
         test_schema_path: str | None = None,
+        architecture: str | None = None,
+        reserved_concurrency: int | None = None,
+        snap_start: bool | None = None,
     ) -> Function:
         func = Function(
             self.scope,
@@ -89,6 +184,11 @@ class LambdaCreator:
             ephemeral_storage_size=(
                 Size.mebibytes(storage_size) if storage_size else None
             ),
+            architecture=(
+                Architecture.ARM_64 if architecture == "arm64" else Architecture.X86_64
+            ),
+            reserved_concurrent_executions=reserved_concurrency,
+            snap_start=SnapStartConf.ON_PUBLISHED_VERSIONS if snap_start else None,
         )
         for name in managed_policy_list:
             func.role.add_managed_policy(
@@ -131,7 +231,7 @@ class LambdaCreator:
         　リソースベースのポリシーで許可していれば、
         　呼び出し側のアイデンティティベースのポリシーで明示的に許可するのは不要
         """
-        self.func.add_permission(
+        self.target.add_permission(
             "{}-permission".format(self.lambda_name),
             principal=ServicePrincipal("apigateway.amazonaws.com"),
             action="lambda:InvokeFunction",
@@ -142,14 +242,38 @@ class LambdaCreator:
     def called_by_sqs(
         self,
         queue: Queue,
+        *,
+        batch_size: int | None = None,
+        max_batching_window: int | None = None,
+        max_concurrency: int | None = None,
+        report_batch_item_failures: bool | None = None,
     ) -> LambdaCreator:
         """
         lambdaをsqsから呼び出せるようにします
         ※lambda側にリソースベースのポリシーを設定します。
         　リソースベースのポリシーで許可していれば、
         　呼び出し側のアイデンティティベースのポリシーで明示的に許可するのは不要
+
+        parameters:
+          batch_size: 1回の呼び出しで受け取るメッセージ数の上限。Noneの場合は1
+          max_batching_window: メッセージをまとめる為に待つ最大秒数
+          max_concurrency: sqsから同時に呼び出す数の上限（2以上）
+          report_batch_item_failures: Trueの場合、lambdaがbatchItemFailuresを返すことで
+                                      失敗したメッセージのみを再実行させられます
         """
-        self.func.add_event_source(SqsEventSource(queue, batch_size=1))
+        self.target.add_event_source(
+            SqsEventSource(
+                queue,
+                batch_size=batch_size if batch_size is not None else 1,
+                max_batching_window=(
+                    Duration.seconds(max_batching_window)
+                    if max_batching_window is not None
+                    else None
+                ),
+                max_concurrency=max_concurrency,
+                report_batch_item_failures=report_batch_item_failures,
+            )
+        )
         return self
 
     def called_by_sns(
@@ -162,5 +286,5 @@ class LambdaCreator:
         　リソースベースのポリシーで許可していれば、
         　呼び出し側のアイデンティティベースのポリシーで明示的に許可するのは不要
         """
-        self.func.add_event_source(SnsEventSource(topic))
+        self.target.add_event_source(SnsEventSource(topic))
         return self
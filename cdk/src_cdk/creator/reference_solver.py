@@ -1,3 +1,7 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from aws_cdk import Stack
 from aws_cdk.aws_lambda import LayerVersion, ILayerVersion
 from aws_cdk.aws_apigatewayv2 import CfnApi
@@ -52,12 +56,26 @@ class NameSolver:
 
 
 class ReferenceSolver:
+    # 名前で指定されたlambda layerのversionを保存するファイル名（app.pyと同じフォルダに作成）
+    # cdk.context.jsonはcdk CLIがlookup後に自身のcontextで上書きするため使用せず、
+    # app.pyでこのファイルを読み込みcontextとしてAppに渡す（read_layer_version_contextを参照）
+    LAYER_VERSION_JSON = "layer_version.context.json"
+    # --context refresh_layer_version=true: 保存したversionを使用せず最新のversionを取得し直す
+    CONTEXT_REFRESH_LAYER_VERSION = "refresh_layer_version"
+    # --context stub_layer_version=true: AWSに問い合わせない（保存したversionが無い場合は1とする）
+    CONTEXT_STUB_LAYER_VERSION = "stub_layer_version"
+    STUB_LAYER_VERSION = 1
+    MAX_WORKERS = 8
+
     def __init__(
         self,
         scope: Stack,
         ref_spec: dict[str, dict] | None = None,
+        *,
+        layer_version_path: str | None = None,
     ):
         self.scope = scope
+        self.layer_version_path = layer_version_path
         self.lambda_layer = (
             self._solve_lambda_layer(ref_spec["lambda_layer"])
             if ref_spec is not None and "lambda_layer" in ref_spec
@@ -122,8 +140,17 @@ class ReferenceSolver:
         # get lambda layer reference
         layer_dict: dict[str, ILayerVersion] = {}
 
+        version_dict = self._resolve_lambda_layer_version(
+            [
+                layer_arn_or_name
+                for layer_arn_or_name in ref_layer_dict.values()
+                if not layer_arn_or_name.startswith("arn:")
+            ]
+        )
         for layer_id, layer_arn_or_name in ref_layer_dict.items():
-            _layer_version_arn = self._resolve_lambda_layer_arn(layer_arn_or_name)
+            _layer_version_arn = self._resolve_lambda_layer_arn(
+                layer_arn_or_name, version_dict
+            )
             layer_dict[layer_id] = LayerVersion.from_layer_version_arn(
                 self.scope,
                 _layer_version_arn,
@@ -131,12 +158,89 @@ class ReferenceSolver:
             )
         return layer_dict
 
-    def _resolve_lambda_layer_arn(self, arn_or_name: str):
+    def _resolve_lambda_layer_arn(self, arn_or_name: str, version_dict: dict):
         if arn_or_name.startswith("arn:"):
             return arn_or_name
         else:
             layer_name = arn_or_name
-            ver = LambdaLayerChecker(layer_name).get_latest_version()
+            ver = version_dict[layer_name]
             return "arn:aws:lambda:{}:{}:layer:{}:{}".format(
                 self.scope.region, self.scope.account, layer_name, ver
             )
+
+    def _get_layer_context_key(self, layer_name: str) -> str:
+        return "lambda-layer-version:account={}:layerName={}:region={}".format(
+            self.scope.account, layer_name, self.scope.region
+        )
+
+    def _is_context_flag_on(self, key: str) -> bool:
+        return str(self.scope.node.try_get_context(key)).lower() == "true"
+
+    def _resolve_lambda_layer_version(self, layer_name_list: list[str]) -> dict:
+        """
+        lambda layerの名前毎に最新のversionを返します
+        - contextに保存されたversionがあればそれを使用します
+        - 保存されていないlayerは並列にAWSに問い合わせ、結果をlayer_version_pathに保存します
+        """
+        refresh = self._is_context_flag_on(self.CONTEXT_REFRESH_LAYER_VERSION)
+        stub = self._is_context_flag_on(self.CONTEXT_STUB_LAYER_VERSION)
+
+        version_dict = {}
+        lookup_list = []
+        for layer_name in dict.fromkeys(layer_name_list):
+            ver = self.scope.node.try_get_context(
+                self._get_layer_context_key(layer_name)
+            )
+            if ver is not None and (stub or not refresh):
+                version_dict[layer_name] = ver
+            elif stub:
+                print(
+                    f"[Warn] use stub version {self.STUB_LAYER_VERSION} for lambda layer '{layer_name}'"
+                )
+                version_dict[layer_name] = self.STUB_LAYER_VERSION
+            else:
+                lookup_list.append(layer_name)
+
+        if len(lookup_list) > 0:
+            # boto3のclientの作成はスレッドセーフではないため、checker（client）はこのスレッドで作成し、
+            # 並列には問い合わせのみを行う
+            checker_list = [
+                LambdaLayerChecker(layer_name) for layer_name in lookup_list
+            ]
+            with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+                ver_list = list(
+                    executor.map(
+                        lambda checker: checker.get_latest_version(), checker_list
+                    )
+                )
+            lookup_dict = dict(zip(lookup_list, ver_list))
+            version_dict.update(lookup_dict)
+            self._save_context(
+                {
+                    self._get_layer_context_key(layer_name): ver
+                    for layer_name, ver in lookup_dict.items()
+                }
+            )
+        return version_dict
+
+    @staticmethod
+    def read_layer_version_context(layer_version_path: str) -> dict:
+        """
+        layer_version_pathに保存されたlambda layerのversionを、Appに渡すcontextとして返します
+        """
+        if not os.path.exists(layer_version_path):
+            return {}
+        with open(layer_version_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _save_context(self, context_dict: dict):
+        if self.layer_version_path is None:
+            print(
+                "[Warn] layer_version_path is not set: lambda layer versions are not saved"
+            )
+            return
+        context_json = self.read_layer_version_context(self.layer_version_path)
+        context_json.update(context_dict)
+        with open(self.layer_version_path, "w", encoding="utf-8") as f:
+            json.dump(context_json, f, indent=2)
+            f.write("\n")
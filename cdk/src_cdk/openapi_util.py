@@ -1,11 +1,12 @@
 import os
 import sys
+import json
 import importlib
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import yaml
-from fastapi import FastAPI
-from fastapi.openapi.utils import get_openapi
 
 
 class OpenApiSchema:
@@ -31,7 +32,12 @@ class OpenApiSchema:
 
     @staticmethod
     def from_fastapi_modeule(module_name: str, import_root: str, app_name: str = "app"):
-        sys.path.append(os.path.abspath(import_root))
+        # fastapiはfastapiのアプリからスキーマを作る場合のみ必要なので、ここでimportする
+        from fastapi import FastAPI
+        from fastapi.openapi.utils import get_openapi
+
+        # lambdaのモジュール（lambdaに同梱したawsutil等）をsite-packages等より優先してimportする
+        sys.path.insert(0, os.path.abspath(import_root))
         print(os.path.abspath(import_root))
         mod = importlib.import_module(module_name)
         app: FastAPI = getattr(mod, app_name)
@@ -49,3 +55,43 @@ class OpenApiSchema:
             for path, method_dict in self.spec["paths"].items()
             for method in method_dict
         ]
+
+    @staticmethod
+    def get_fastapi_route_list(
+        request_list: list[tuple[str, str, str]],
+        *,
+        max_workers: int = 4,
+    ) -> list[list[str]]:
+        """
+        fastapiのアプリからapigwのルートを抽出し、request_listと同じ順序で返します
+        - request_listの各要素は(module_name, import_root, app_name)です
+        - 抽出は別プロセスで行う為、このプロセスにはfastapiやlambdaのモジュールがimportされません
+          （lambda毎にモジュール名が同じでも、他のlambdaのモジュールと混ざることはありません）
+        - 別プロセスは-Pで実行し、このファイルのフォルダ（cdkのawsutil等を含む）をsys.pathに加えません
+        - 最大でmax_workers個のプロセスを並列に実行します
+        """
+
+        def extract(request: tuple[str, str, str]) -> list[str]:
+            module_name, import_root, app_name = request
+            result = subprocess.run(
+                [sys.executable, "-P", __file__, module_name, import_root, app_name],
+                capture_output=True,
+                text=True,
+            )
+            if result.returncode != 0:
+                raise Exception(
+                    f"failed to extract routes of fastapi app '{app_name}' in {import_root}:\n{result.stderr}"
+                )
+            # 抽出したルートは標準出力の最後の行に出力される
+            return json.loads(result.stdout.strip().splitlines()[-1])
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(extract, request_list))
+
+
+if __name__ == "__main__":
+    # usage: python openapi_util.py <module_name> <import_root> <app_name>
+    openapi = OpenApiSchema.from_fastapi_modeule(
+        sys.argv[1], sys.argv[2], app_name=sys.argv[3]
+    )
+    print(json.dumps(openapi.get_apigw_route()))
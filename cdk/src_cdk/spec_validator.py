@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import hashlib
+import json
+
+from jsonschema import Draft202012Validator
+
+from .synth_cache import SynthCache
+
+
+class SpecValidationError(Exception):
+    def __init__(self, error_list: list[str]):
+        self.error_list = error_list
+        super().__init__(
+            "spec is invalid ({} errors):\n{}".format(
+                len(error_list), "\n".join(error_list)
+            )
+        )
+
+
+class SpecValidator:
+    """
+    spec定義をjson schemaで検証します
+    - synth_cacheを指定した場合、前回までのsynthでチェック済みのschemaと同じであればschemaのチェックを省略します
+    - synth_cacheを指定した場合、前回のsynthで検証に成功したspec（とschema）と同じであれば検証を省略します
+    - 検証に失敗した場合は、最初のエラーで止めずに全てのエラーをjson pathと共に報告します
+    """
+
+    def __init__(self, schema_path: str, synth_cache: SynthCache | None = None):
+        with open(schema_path, "rb") as f:
+            data = f.read()
+        self.schema_hash = hashlib.sha256(data).hexdigest()
+        self.synth_cache = synth_cache
+        json_schema = json.loads(data)
+
+        def check_schema() -> bool:
+            Draft202012Validator.check_schema(json_schema)
+            return True
+
+        if synth_cache is None:
+            check_schema()
+        else:
+            synth_cache.get_or_create("schema_check", self.schema_hash, check_schema)
+        self.validator = Draft202012Validator(json_schema)
+
+    def get_error_list(self, spec_dict: dict) -> list[str]:
+        return [
+            f"{error.json_path}: {error.message}"
+            for error in sorted(
+                self.validator.iter_errors(spec_dict), key=lambda e: e.json_path
+            )
+        ]
+
+    def validate(self, spec_dict: dict):
+        """
+        spec_dictを検証し、エラーがあればSpecValidationErrorをスローします
+        """
+
+        def validate_all() -> bool:
+            error_list = self.get_error_list(spec_dict)
+            if len(error_list) > 0:
+                raise SpecValidationError(error_list)
+            return True
+
+        if self.synth_cache is None:
+            validate_all()
+        else:
+            self.synth_cache.get_or_create(
+                "spec_validation",
+                self.synth_cache.get_hash(
+                    {"schema": self.schema_hash, "spec": spec_dict}
+                ),
+                validate_all,
+            )
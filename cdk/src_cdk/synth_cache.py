@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any, Callable
+
+
+class SynthCache:
+    """
+    cdk synth間で再利用できる計算結果をファイルに保存するキャッシュ
+    - キーはspec定義の各セクションと、そのセクションが参照するファイル（lambdaのコード、policyのjson、openapiのyaml等）の内容のハッシュです
+    - 参照先の内容が変わらない限り、前回のsynthで求めた値（例：fastapiから抽出したapigwのルート）を再利用します
+    注）cdkのconstructはsynth毎に生成し直す必要がある為、テンプレートの断片自体はキャッシュしません
+    """
+
+    CACHE_FILE_NAME = "synth_cache.json"
+
+    def __init__(self, cache_dir: str | None = None):
+        """
+        cache_dirがNoneの場合はファイルに保存せず、今回のsynth中のみ有効なキャッシュとして動作します
+        """
+        self.cache_dir = cache_dir
+        self.value_dict: dict[str, dict[str, Any]] = {}
+        self.used_value_dict: dict[str, dict[str, Any]] = {}
+        self.prev_section_hash_dict: dict[str, str] = {}
+        self.section_hash_dict: dict[str, str] = {}
+        self.hit_list: list[str] = []
+        self.miss_list: list[str] = []
+        self._file_hash_dict: dict[str, str] = {}
+        self.prev_file_hash_dict: dict[str, dict] = {}
+        self.file_hash_dict: dict[str, dict] = {}
+        self.rehashed_path_list: list[str] = []
+
+        if self.cache_dir is not None:
+            path = os.path.join(self.cache_dir, self.CACHE_FILE_NAME)
+            if os.path.exists(path):
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        data = json.load(f)
+                    self.value_dict = data.get("value", {})
+                    self.prev_section_hash_dict = data.get("section_hash", {})
+                    self.prev_file_hash_dict = data.get("file_hash", {})
+                except (OSError, ValueError) as ex:
+                    print(f"[Warn] ignore broken synth cache: {ex}")
+
+    def get_file_hash(self, path: str) -> str:
+        """
+        ファイルもしくはフォルダ（配下の全ファイル）の内容のハッシュを返します
+        - 同じパスのハッシュは1回のsynth中で1度だけ計算します
+        - 配下の全ファイルのパス・サイズ・更新時刻が前回のsynthと同じ場合、内容を読まずに前回のハッシュを返します
+        """
+        abs_path = os.path.abspath(path)
+        if abs_path not in self._file_hash_dict:
+            file_path_list = self._list_files(abs_path)
+            signature = self._get_stat_signature(abs_path, file_path_list)
+            prev = self.prev_file_hash_dict.get(abs_path)
+            if prev is not None and prev["signature"] == signature:
+                file_hash = prev["hash"]
+            else:
+                self.rehashed_path_list.append(abs_path)
+                sha = hashlib.sha256()
+                if not os.path.exists(abs_path):
+                    sha.update(b"<not found>")
+                for file_path in file_path_list:
+                    sha.update(os.path.relpath(file_path, abs_path).encode())
+                    self._update_by_file(sha, file_path)
+                file_hash = sha.hexdigest()
+            self._file_hash_dict[abs_path] = file_hash
+            self.file_hash_dict[abs_path] = {"signature": signature, "hash": file_hash}
+        return self._file_hash_dict[abs_path]
+
+    @staticmethod
+    def _list_files(abs_path: str) -> list[str]:
+        if not os.path.isdir(abs_path):
+            return [abs_path] if os.path.exists(abs_path) else []
+        file_path_list = []
+        for dir_path, dir_list, file_list in os.walk(abs_path):
+            dir_list[:] = sorted(d for d in dir_list if d != "__pycache__")
+            for file_name in sorted(file_list):
+                file_path_list.append(os.path.join(dir_path, file_name))
+        return file_path_list
+
+    @staticmethod
+    def _get_stat_signature(abs_path: str, file_path_list: list[str]) -> str:
+        sha = hashlib.sha256()
+        for file_path in file_path_list:
+            stat = os.stat(file_path)
+            sha.update(
+                "{}:{}:{}\n".format(
+                    os.path.relpath(file_path, abs_path),
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                ).encode()
+            )
+        return sha.hexdigest()
+
+    @staticmethod
+    def _update_by_file(sha, file_path: str) -> None:
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+
+    def get_hash(self, spec: Any, path_list: list[str] | None = None) -> str:
+        """
+        spec（jsonに変換可能な値）と参照するファイルの内容から求まるハッシュを返します
+        """
+        sha = hashlib.sha256()
+        sha.update(json.dumps(spec, sort_keys=True, ensure_ascii=False).encode())
+        for path in path_list or []:
+            sha.update(self.get_file_hash(path).encode())
+        return sha.hexdigest()
+
+    def add_section(
+        self, section_name: str, spec: Any, path_list: list[str] | None = None
+    ) -> bool:
+        """
+        spec定義のセクションのハッシュを記録し、前回のsynthから変化していないかを返します
+        """
+        section_hash = self.get_hash(spec, path_list)
+        self.section_hash_dict[section_name] = section_hash
+        return self.prev_section_hash_dict.get(section_name) == section_hash
+
+    def get_or_create(
+        self,
+        kind: str,
+        key: str,
+        create_func: Callable[[], Any],
+    ) -> Any:
+        """
+        kindとkey（get_hashで求めたハッシュ等）に対応する値を返します
+        キャッシュに無い場合はcreate_funcを呼び出して値を作成し、キャッシュします（値はjsonに変換可能であること）
+        """
+        kind_dict = self.value_dict.setdefault(kind, {})
+        if key in kind_dict:
+            self.hit_list.append(kind)
+            value = kind_dict[key]
+        else:
+            self.miss_list.append(kind)
+            value = create_func()
+            kind_dict[key] = value
+        self.used_value_dict.setdefault(kind, {})[key] = value
+        return value
+
+    def get_or_create_many(
+        self,
+        kind: str,
+        key_list: list[str],
+        create_many_func: Callable[[list[int]], list[Any]],
+    ) -> list[Any]:
+        """
+        get_or_createを複数のkeyに対してまとめて行い、key_listと同じ順序で値を返します
+        キャッシュに無いkeyがある場合は、そのkeyのkey_list中の位置のリストを引数にcreate_many_funcを1度だけ呼び出します
+        （create_many_funcは引数と同じ順序で値のリストを返すこと）
+        """
+        kind_dict = self.value_dict.setdefault(kind, {})
+        miss_index_list = [i for i, key in enumerate(key_list) if key not in kind_dict]
+        if len(miss_index_list) > 0:
+            for i, value in zip(miss_index_list, create_many_func(miss_index_list)):
+                kind_dict[key_list[i]] = value
+        self.hit_list += [kind] * (len(key_list) - len(miss_index_list))
+        self.miss_list += [kind] * len(miss_index_list)
+
+        used_dict = self.used_value_dict.setdefault(kind, {})
+        value_list = []
+        for key in key_list:
+            used_dict[key] = kind_dict[key]
+            value_list.append(kind_dict[key])
+        return value_list
+
+    def save(self) -> None:
+        """
+        今回のsynthで使用した値のみをファイルに保存します（使用しなかった古い値は破棄します）
+        """
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, self.CACHE_FILE_NAME)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "section_hash": self.section_hash_dict,
+                    "file_hash": self.file_hash_dict,
+                    "value": self.used_value_dict,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+
+    def print_report(self) -> None:
+        unchanged_list = [
+            name
+            for name, section_hash in self.section_hash_dict.items()
+            if self.prev_section_hash_dict.get(name) == section_hash
+        ]
+        changed_list = [
+            name for name in self.section_hash_dict if name not in unchanged_list
+        ]
+        print("-----------synth cache report------------")
+        print(
+            "sections: {} unchanged / {} changed".format(
+                len(unchanged_list), len(changed_list)
+            )
+        )
+        for name in changed_list:
+            print(f"  changed: {name}")
+        print(
+            "file hash: {} reused / {} rehashed".format(
+                len(self.file_hash_dict) - len(self.rehashed_path_list),
+                len(self.rehashed_path_list),
+            )
+        )
+        for kind in sorted(set(self.hit_list + self.miss_list)):
+            print(
+                "{}: {} hit / {} miss".format(
+                    kind, self.hit_list.count(kind), self.miss_list.count(kind)
+                )
+            )
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+from constructs import IConstruct
+
+
+class SynthProfiler:
+    """
+    cdk synthの各処理にかかった時間と、作成されたconstructの数を計測します
+    - phase()で囲んだ処理の時間を名前毎に集計します（同じ名前の処理は合計時間と回数を記録します）
+    - enabledがFalseの場合は何も計測しません
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.start_time = time.perf_counter()
+        self.phase_dict: dict[str, dict[str, float]] = {}
+        self.construct_count_dict: dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.phase_dict.setdefault(name, {"sec": 0.0, "count": 0})
+            record["sec"] += time.perf_counter() - start
+            record["count"] += 1
+
+    def count_constructs(self, root: IConstruct) -> None:
+        """
+        root配下に作成されたconstructの数をconstructの型毎に数えます
+        """
+        if not self.enabled:
+            return
+        self.construct_count_dict = dict(
+            Counter(type(c).__name__ for c in root.node.find_all()).most_common()
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "total_sec": time.perf_counter() - self.start_time,
+            "phase": dict(
+                sorted(
+                    self.phase_dict.items(),
+                    key=lambda item: item[1]["sec"],
+                    reverse=True,
+                )
+            ),
+            "construct_count": self.construct_count_dict,
+            "construct_total": sum(self.construct_count_dict.values()),
+        }
+
+    def write_report(self, path: str) -> None:
+        if not self.enabled:
+            return
+        report = self.to_dict()
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print("-----------synth profile------------")
+        print("total: {:.2f} sec".format(report["total_sec"]))
+        for name, record in report["phase"].items():
+            print(
+                "{}: {:.2f} sec ({} calls)".format(name, record["sec"], record["count"])
+            )
+        print("constructs: {}".format(report["construct_total"]))
+        print(f"report: {path}")
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import hashlib
+import re
+from typing import Any
+
+# 置換対象のプレースホルダ：{$変数名}
+PLACEHOLDER_PATTERN = re.compile(r"\{\$([A-Za-z_][A-Za-z0-9_]*)\}")
+
+
+class TemplateError(Exception):
+    pass
+
+
+class Template:
+    """
+    {$変数名}のプレースホルダを含む文字列のテンプレート
+    - 文字列は作成時に1度だけ解析し、固定文字列と変数名のトークン列として保持します
+    - renderでは全てのプレースホルダを1回の走査で置換します
+    - 値が与えられていない変数がある場合はTemplateErrorをスローします
+    """
+
+    _template_dict: dict[str, Template] = {}
+    _rendered_dict: dict[tuple, str] = {}
+
+    def __init__(self, text: str, name: str | None = None):
+        self.name = name
+        # (変数かどうか, 固定文字列もしくは変数名)のリスト
+        self.token_list: list[tuple[bool, str]] = []
+        pos = 0
+        for match in PLACEHOLDER_PATTERN.finditer(text):
+            if match.start() > pos:
+                self.token_list.append((False, text[pos : match.start()]))
+            self.token_list.append((True, match.group(1)))
+            pos = match.end()
+        if pos < len(text):
+            self.token_list.append((False, text[pos:]))
+        self.variable_set = {val for is_var, val in self.token_list if is_var}
+
+    def render(self, variable_dict: dict[str, str]) -> str:
+        unknown_set = self.variable_set - variable_dict.keys()
+        if len(unknown_set) > 0:
+            raise TemplateError(
+                "unknown variables {} in {}".format(
+                    ", ".join("{$" + name + "}" for name in sorted(unknown_set)),
+                    self.name if self.name is not None else "template",
+                )
+            )
+        return "".join(
+            variable_dict[val] if is_var else val for is_var, val in self.token_list
+        )
+
+    @classmethod
+    def from_text(cls, text: str, name: str | None = None) -> Template:
+        """
+        textのテンプレートを返します（同じ内容のテンプレートは1度だけ解析します）
+        """
+        key = hashlib.sha256(text.encode()).hexdigest()
+        if key not in cls._template_dict:
+            cls._template_dict[key] = Template(text, name)
+        return cls._template_dict[key]
+
+    @classmethod
+    def render_file(cls, path: str, variable_dict: dict[str, str]) -> str:
+        """
+        pathのファイルをテンプレートとしてvariable_dictで置換した文字列を返します
+        同じ内容のファイルを同じ変数で置換した結果は1度だけ作成します
+        """
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        key = (
+            hashlib.sha256(text.encode()).hexdigest(),
+            tuple(sorted(variable_dict.items())),
+        )
+        if key not in cls._rendered_dict:
+            cls._rendered_dict[key] = cls.from_text(text, path).render(variable_dict)
+        return cls._rendered_dict[key]
+
+
+def render_obj(obj: Any, variable_dict: dict[str, str]) -> Any:
+    """
+    jsonから読み込んだ値（dict/list/str等）中の全ての文字列（dictのキーを含む）をテンプレートとして置換した値を返します
+    """
+    if isinstance(obj, str):
+        if "{$" not in obj:
+            return obj
+        return Template.from_text(obj).render(variable_dict)
+    if isinstance(obj, dict):
+        return {
+            render_obj(key, variable_dict): render_obj(val, variable_dict)
+            for key, val in obj.items()
+        }
+    if isinstance(obj, list):
+        return [render_obj(val, variable_dict) for val in obj]
+    return obj
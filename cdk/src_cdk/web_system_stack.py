@@ -1,14 +1,12 @@
-import json
 import os
 
-from aws_cdk import Stack, Tags
-from aws_cdk.aws_lambda import Code, Function, Runtime
+from aws_cdk import AssetHashType, NestedStack, Stack, Tags
+from aws_cdk.aws_lambda import AssetCode, Code, Function, Runtime
 from aws_cdk.aws_sns import Topic
 from aws_cdk.aws_apigatewayv2 import CfnApi
 from aws_cdk.aws_cognito import UserPool, UserPoolClient
 
 from constructs import Construct
-from jsonschema import Draft202012Validator
 
 from .creator.lambda_creator import LambdaCreator
 from .creator.apigateway_creator import ApiGatewayCreator, CognitoRef
@@ -21,6 +19,9 @@ from .creator.amplify_creator import AmplifyCreator
 from .creator.reference_solver import ReferenceSolver, NameSolver
 
 from .openapi_util import OpenApiSchema
+from .spec_validator import SpecValidator
+from .synth_cache import SynthCache
+from .synth_profiler import SynthProfiler
 
 
 class WebSystemCreator:
@@ -30,6 +31,7 @@ class WebSystemCreator:
     ENV_API_KEY = "API"
     ENV_SERVICE_KEY = "Service"
     ENV_NEXT_SQS_KEY = "NextSQS"
+    PATH_SPEC_KEY_LIST = ["code", "inline_policy", "test", "openapi_yaml"]
 
     def __init__(
         self,
@@ -46,6 +48,10 @@ class WebSystemCreator:
         default_runtime: str | None = None,
         repository_root: str | None = None,
         repository_token: str | None = None,
+        synth_cache: SynthCache | None = None,
+        branch_stack: str | None = None,
+        profiler: SynthProfiler | None = None,
+        layer_version_path: str | None = None,
     ):
         self.stack = stack
         self.service_name = service_name
@@ -54,12 +60,19 @@ class WebSystemCreator:
         self.lambda_handler = lambda_handler
         self.common_lambda_policy = common_lambda_policy
 
-        self.ref = ReferenceSolver(self.stack, ref_spec)
+        self.profiler = profiler if profiler is not None else SynthProfiler(False)
+        with self.profiler.phase("ReferenceSolver"):
+            self.ref = ReferenceSolver(
+                self.stack, ref_spec, layer_version_path=layer_version_path
+            )
         self.tags = tags
         self.root_path = root_path
         self.default_runtime = default_runtime
         self.repository_root = repository_root
         self.repository_token = repository_token
+        self.synth_cache = synth_cache if synth_cache is not None else SynthCache()
+        self._asset_code_dict: dict[tuple[str, str], AssetCode] = {}
+        self.branch_stack = branch_stack if branch_stack is not None else "single"
 
         self.name = NameSolver(self.stack, api_name)
 
@@ -72,6 +85,61 @@ class WebSystemCreator:
         else:
             return os.path.join(self.root_path, path)
 
+    def get_asset_code(self, path: str, scope: Stack | None = None) -> AssetCode:
+        """
+        pathのフォルダをlambdaのコードとするassetを返します
+        - 同じスタック中では、同じフォルダのassetは（branchやlambda_keyが異なっても）1つだけ作成し共有します
+        - assetのハッシュはsynth_cacheで求めます（フォルダが変化していなければ前回のsynthのハッシュを再利用します）
+        """
+        abs_path = os.path.abspath(self.resolve_path(path))
+        # assetは1つのスタックでしか使用できないので、スタック毎に作成する
+        key = (Stack.of(scope or self.stack).node.path, abs_path)
+        if key not in self._asset_code_dict:
+            with self.profiler.phase("asset_hash"):
+                asset_hash = self.synth_cache.get_file_hash(abs_path)
+            self._asset_code_dict[key] = Code.from_asset(
+                abs_path,
+                asset_hash=asset_hash,
+                asset_hash_type=AssetHashType.CUSTOM,
+            )
+        return self._asset_code_dict[key]
+
+    def get_referenced_path_list(self, spec) -> list[str]:
+        """
+        spec中で参照されているファイル/フォルダのパス（PATH_SPEC_KEY_LISTのキーの値）を全て返します
+        """
+        path_list = []
+        if isinstance(spec, dict):
+            for key, val in spec.items():
+                if key in self.PATH_SPEC_KEY_LIST and isinstance(val, (str, list)):
+                    for path in val if isinstance(val, list) else [val]:
+                        path_list.append(self.resolve_path(path))
+                else:
+                    path_list += self.get_referenced_path_list(val)
+        elif isinstance(spec, list):
+            for val in spec:
+                path_list += self.get_referenced_path_list(val)
+        return path_list
+
+    def add_cache_sections(self, spec_dict: dict) -> None:
+        """
+        spec定義の各セクション（lambda_funcはlambda毎）をsynth_cacheに登録します
+        """
+        for section_name, section_spec in spec_dict.items():
+            if section_name == "lambda_func":
+                for lambda_key, lambda_spec in section_spec.items():
+                    self.synth_cache.add_section(
+                        f"lambda_func.{lambda_key}",
+                        lambda_spec,
+                        self.get_referenced_path_list(lambda_spec),
+                    )
+            else:
+                self.synth_cache.add_section(
+                    section_name,
+                    section_spec,
+                    self.get_referenced_path_list(section_spec),
+                )
+
     def construct_env_dict(
         self,
         branch_name: str | None = None,
@@ -131,6 +199,8 @@ class WebSystemCreator:
           - lambda
           - sqs
           - batch
+        - branch_stackが"nested"の場合、branch毎のリソースはbranch毎のネストされたスタック中に作成します。
+          （branch毎のスタックは並列にデプロイされ、あるbranchの変更は他のbranchのスタックに影響しません）
 
         parameters:
           root_path: spec_dict中で記載されている相対パスにおけるルートパスを設定します。
@@ -163,7 +233,8 @@ class WebSystemCreator:
             self.ref.set_cognito_client(client_dict)
 
         if apigw_spec is not None:
-            api = self._create_apigw(apigw_spec, lambda_spec_dict)
+            with self.profiler.phase("_create_apigw"):
+                api = self._create_apigw(apigw_spec, lambda_spec_dict)
             self.ref.set_api(api)
 
         if s3_spec_dict is not None:
@@ -172,16 +243,24 @@ class WebSystemCreator:
         # create repository (for each batch_func spec)
         if batch_spec_dict is not None:
             for batch_key in batch_spec_dict.keys():
-                ECRCreator(self.stack, self.name.get_repo_name(batch_key))
+                with self.profiler.phase("ECRCreator"):
+                    ECRCreator(self.stack, self.name.get_repo_name(batch_key))
 
         # for each branch
         for branch_name in self.branch_spec_dict:
+            branch_scope = (
+                NestedStack(self.stack, f"{self.api_name}-{branch_name}")
+                if self.branch_stack == "nested"
+                else self.stack
+            )
+
             # create lambdas (for each branch and each lambda_func spec)
             lambda_func_dict = self._create_lambda(
                 lambda_spec_dict,
                 common_managed_policy_list=self.common_lambda_policy,
                 branch_name=branch_name,
                 apigw_spec=apigw_spec,
+                scope=branch_scope,
             )
 
             # create batchs (for each branch and each batch_func spec)
@@ -190,6 +269,7 @@ class WebSystemCreator:
                     branch_name,
                     batch_spec_dict,
                     lambda_func_dict,
+                    scope=branch_scope,
                 )
 
         if self.tags is not None:
@@ -208,21 +288,22 @@ class WebSystemCreator:
                 if "cognito_auth" in app_spec
                 else None
             )
-            amplify = AmplifyCreator(
-                self.stack,
-                app_name,
-                {
-                    branch_name: {
-                        "stage": branch_spec["amplify_type"],
-                        "env": self.construct_env_dict(branch_name),
-                    }
-                    for branch_name, branch_spec in self.branch_spec_dict.items()
-                },
-                self.repository_root,
-                self.repository_token,
-                app_spec["domain"],
-                app_description=app_spec.get("app_description"),
-            )
+            with self.profiler.phase("AmplifyCreator"):
+                amplify = AmplifyCreator(
+                    self.stack,
+                    app_name,
+                    {
+                        branch_name: {
+                            "stage": branch_spec["amplify_type"],
+                            "env": self.construct_env_dict(branch_name),
+                        }
+                        for branch_name, branch_spec in self.branch_spec_dict.items()
+                    },
+                    self.repository_root,
+                    self.repository_token,
+                    app_spec["domain"],
+                    app_description=app_spec.get("app_description"),
+                )
 
             if user_pool is not None:
                 client = amplify.create_cognito_login_page(user_pool)
@@ -252,12 +333,13 @@ class WebSystemCreator:
         s3_spec_dict: dict[str, dict],
     ):
         for bucket_name, s3_spec in s3_spec_dict.items():
-            S3Creator(
-                self.stack,
-                bucket_name,
-                public_read=s3_spec.get("public_read"),
-                website_hosting=s3_spec.get("website_hosting"),
-            )
+            with self.profiler.phase("S3Creator"):
+                S3Creator(
+                    self.stack,
+                    bucket_name,
+                    public_read=s3_spec.get("public_read"),
+                    website_hosting=s3_spec.get("website_hosting"),
+                )
 
     def _create_apigw(
         self,
@@ -269,40 +351,79 @@ class WebSystemCreator:
         for lambda_key, route_spec in lambda_integration_spec.items():
             assert lambda_key in lambda_spec_dict
             if "openapi_yaml" in route_spec:
-                openapi = OpenApiSchema.from_yaml(
-                    self.resolve_path(route_spec["openapi_yaml"])
+                yaml_path = self.resolve_path(route_spec["openapi_yaml"])
+                route_spec["route"] = self.synth_cache.get_or_create(
+                    "apigw_route",
+                    self.synth_cache.get_hash({"openapi_yaml": yaml_path}, [yaml_path]),
+                    lambda: OpenApiSchema.from_yaml(yaml_path).get_apigw_route(),
                 )
-                route_spec["route"] = openapi.get_apigw_route()
-            if "fastapi_app" in route_spec:
-                lambda_spec = lambda_spec_dict[lambda_key]
-                openapi = OpenApiSchema.from_fastapi_modeule(
-                    ".".join(self.lambda_handler.split(".")[0:-1]),
-                    self.resolve_path(lambda_spec["code"]),
-                    app_name=route_spec["fastapi_app"],
-                )
-                route_spec["route"] = openapi.get_apigw_route()
 
-        api_creator = (
-            ApiGatewayCreator(
-                self.stack,
-                self.api_name,
-                apigw_spec.get("api_description"),
+        # fastapiのアプリからのルートの抽出は時間がかかるので、別プロセスでまとめて並列に行う
+        fastapi_key_list = [
+            lambda_key
+            for lambda_key, route_spec in lambda_integration_spec.items()
+            if "fastapi_app" in route_spec
+        ]
+        if len(fastapi_key_list) > 0:
+            module_name = ".".join(self.lambda_handler.split(".")[0:-1])
+            request_list = [
+                (
+                    module_name,
+                    self.resolve_path(lambda_spec_dict[lambda_key]["code"]),
+                    lambda_integration_spec[lambda_key]["fastapi_app"],
+                )
+                for lambda_key in fastapi_key_list
+            ]
+            route_list_list = self.synth_cache.get_or_create_many(
+                "apigw_route",
+                [
+                    self.synth_cache.get_hash(
+                        {"module": module_name, "code": code_path, "app": app_name},
+                        [code_path],
+                    )
+                    for module_name, code_path, app_name in request_list
+                ],
+                lambda index_list: OpenApiSchema.get_fastapi_route_list(
+                    [request_list[i] for i in index_list]
+                ),
             )
-            .add_stages(
-                {
-                    branch_spec["apigw_stage"]: branch_name
-                    for branch_name, branch_spec in self.branch_spec_dict.items()
-                },
-                zone_name=apigw_spec["domain"],
+            for lambda_key, route_list in zip(fastapi_key_list, route_list_list):
+                lambda_integration_spec[lambda_key]["route"] = route_list
+
+        # provisioned_concurrency/snap_startを使用するlambdaはエイリアスを呼び出す
+        alias_name_dict = {}
+        for lambda_key in lambda_integration_spec:
+            lambda_spec = lambda_spec_dict[lambda_key]
+            alias_name = LambdaCreator.get_alias_name(
+                lambda_spec.get("provisioned_concurrency"),
+                lambda_spec.get("snap_start"),
             )
-            .add_lambda_integrations(
-                lambda_integration_spec,
-                cognito=CognitoRef(
-                    user_pool_dict=self.ref.cognito,
-                    client_id_dict=self.ref.get_cognito_client_id_dict(),
-                ),
+            if alias_name is not None:
+                alias_name_dict[lambda_key] = alias_name
+
+        with self.profiler.phase("ApiGatewayCreator"):
+            api_creator = (
+                ApiGatewayCreator(
+                    self.stack,
+                    self.api_name,
+                    apigw_spec.get("api_description"),
+                )
+                .add_stages(
+                    {
+                        branch_spec["apigw_stage"]: branch_name
+                        for branch_name, branch_spec in self.branch_spec_dict.items()
+                    },
+                    zone_name=apigw_spec["domain"],
+                )
+                .add_lambda_integrations(
+                    lambda_integration_spec,
+                    cognito=CognitoRef(
+                        user_pool_dict=self.ref.cognito,
+                        client_id_dict=self.ref.get_cognito_client_id_dict(),
+                    ),
+                    alias_name_dict=alias_name_dict,
+                )
             )
-        )
         return api_creator.api
 
     def _craete_sns(
@@ -311,11 +432,12 @@ class WebSystemCreator:
     ) -> dict[str, Topic]:
         topic_dict = {}
         for topic_key, sns_spec in sns_spec_dict.items():
-            sns_creator = SNSCreator(
-                self.stack,
-                self.name.get_topic_name(topic_key),
-                sns_spec.get("topic_description"),
-            ).called_by_event_bridge()
+            with self.profiler.phase("SNSCreator"):
+                sns_creator = SNSCreator(
+                    self.stack,
+                    self.name.get_topic_name(topic_key),
+                    sns_spec.get("topic_description"),
+                ).called_by_event_bridge()
             topic_dict[topic_key] = sns_creator.topic
 
             if "lambda_func" in sns_spec:
@@ -337,7 +459,10 @@ class WebSystemCreator:
         branch_name: str | None = None,
         apigw_spec: dict | None = None,
         sender_topic: Topic | None = None,
+        scope: Stack | None = None,
     ) -> dict[str, Function]:
+        if scope is None:
+            scope = self.stack
 
         layer_dict = self.ref.lambda_layer
         lambda_func_dict = {}
@@ -348,39 +473,44 @@ class WebSystemCreator:
                 else None
             )
 
-            lambda_creator = LambdaCreator(
-                self.stack,
-                self.name.get_lambda_name(lambda_key, branch_name),
-                runtime=getattr(
-                    Runtime,
-                    lambda_spec.get("runtime", ""),
-                    getattr(Runtime, self.default_runtime, None),
-                ),
-                inline_policy_json_path_list=[
-                    self.resolve_path(path)
-                    for path in lambda_spec.get("inline_policy", [])
-                ],
-                managed_policy_list=lambda_spec.get("managed_policy", [])
-                + (common_managed_policy_list or []),
-                code=(
-                    Code.from_asset(self.resolve_path(lambda_spec["code"]))
-                    if "code" in lambda_spec
-                    else None
-                ),
-                handler=self.lambda_handler,
-                layers=layers,
-                env_dict=self.construct_env_dict(
-                    branch_name, lambda_key, lambda_spec_dict
-                ),
-                test_schema_path=(
-                    self.resolve_path(lambda_spec.get("test"))
-                    if "test" in lambda_spec
-                    else None
-                ),
-                timeout=lambda_spec.get("timeout"),
-                memory_size=lambda_spec.get("memory_size"),
-                storage_size=lambda_spec.get("storage_size"),
-            )
+            with self.profiler.phase("LambdaCreator"):
+                lambda_creator = LambdaCreator(
+                    scope,
+                    self.name.get_lambda_name(lambda_key, branch_name),
+                    runtime=getattr(
+                        Runtime,
+                        lambda_spec.get("runtime", ""),
+                        getattr(Runtime, self.default_runtime, None),
+                    ),
+                    inline_policy_json_path_list=[
+                        self.resolve_path(path)
+                        for path in lambda_spec.get("inline_policy", [])
+                    ],
+                    managed_policy_list=lambda_spec.get("managed_policy", [])
+                    + (common_managed_policy_list or []),
+                    code=(
+                        self.get_asset_code(lambda_spec["code"], scope)
+                        if "code" in lambda_spec
+                        else None
+                    ),
+                    handler=self.lambda_handler,
+                    layers=layers,
+                    env_dict=self.construct_env_dict(
+                        branch_name, lambda_key, lambda_spec_dict
+                    ),
+                    test_schema_path=(
+                        self.resolve_path(lambda_spec.get("test"))
+                        if "test" in lambda_spec
+                        else None
+                    ),
+                    timeout=lambda_spec.get("timeout"),
+                    memory_size=lambda_spec.get("memory_size"),
+                    storage_size=lambda_spec.get("storage_size"),
+                    architecture=lambda_spec.get("architecture"),
+                    reserved_concurrency=lambda_spec.get("reserved_concurrency"),
+                    provisioned_concurrency=lambda_spec.get("provisioned_concurrency"),
+                    snap_start=lambda_spec.get("snap_start"),
+                )
             if (
                 apigw_spec is not None
                 and lambda_key in apigw_spec["lambda_integration"]
@@ -395,13 +525,22 @@ class WebSystemCreator:
                 additional_timeout = sqs_spec.get("additional_timeout", 10)
                 base_timeout = lambda_spec.get("timeout", 3)
 
-                sqs_creator = SQSCreator(
-                    self.stack,
-                    self.name.get_queue_name(lambda_key, branch_name),
-                    self.name.get_queue_name(lambda_key, branch_name, True),
-                    visibility_timeout_sec=base_timeout + additional_timeout,
+                with self.profiler.phase("SQSCreator"):
+                    sqs_creator = SQSCreator(
+                        scope,
+                        self.name.get_queue_name(lambda_key, branch_name),
+                        self.name.get_queue_name(lambda_key, branch_name, True),
+                        visibility_timeout_sec=base_timeout + additional_timeout,
+                    )
+                lambda_creator.called_by_sqs(
+                    sqs_creator.queue,
+                    batch_size=sqs_spec.get("batch_size"),
+                    max_batching_window=sqs_spec.get("max_batching_window"),
+                    max_concurrency=sqs_spec.get("max_concurrency"),
+                    report_batch_item_failures=sqs_spec.get(
+                        "report_batch_item_failures"
+                    ),
                 )
-                lambda_creator.called_by_sqs(sqs_creator.queue)
             lambda_func_dict[lambda_key] = lambda_creator.func
         return lambda_func_dict
 
@@ -410,6 +549,8 @@ class WebSystemCreator:
         branch_name: str,
         batch_spec_dict: dict[str, dict],
         lambda_func_dict: dict[str, Function],
+        *,
+        scope: Stack | None = None,
     ):
         if self.ref.vpc is None:
             print("[Warn] cannot create batch func: vpc is not defined in spec")
@@ -417,20 +558,21 @@ class WebSystemCreator:
 
         env_dict = self.construct_env_dict(branch_name)
         for batch_key, batch_spec in batch_spec_dict.items():
-            BatchCreator(
-                self,
-                self.name.get_batch_name(batch_key, branch_name),
-                self.name.get_container_url(batch_key, branch_name),
-                batch_spec["maxv_cpus"],
-                self.ref.vpc["subnet_id_list"],
-                self.ref.vpc["security_group_id"],
-                queue_state_lambda=lambda_func_dict[
-                    batch_spec.get("queue_state_lambda")
-                ],
-                env_dict=env_dict,
-                memory=batch_spec.get("memory"),
-                vcpu=batch_spec.get("vcpu"),
-            )
+            with self.profiler.phase("BatchCreator"):
+                BatchCreator(
+                    scope if scope is not None else self.stack,
+                    self.name.get_batch_name(batch_key, branch_name),
+                    self.name.get_container_url(batch_key, branch_name),
+                    batch_spec["maxv_cpus"],
+                    self.ref.vpc["subnet_id_list"],
+                    self.ref.vpc["security_group_id"],
+                    queue_state_lambda=lambda_func_dict[
+                        batch_spec.get("queue_state_lambda")
+                    ],
+                    env_dict=env_dict,
+                    memory=batch_spec.get("memory"),
+                    vcpu=batch_spec.get("vcpu"),
+                )
 
 
 class WebSystemStack(Stack):
@@ -447,16 +589,24 @@ class WebSystemStack(Stack):
         access_token: str | None = None,
         root_path: str | None = None,
         schema_path: str | None = None,
+        cache_dir: str | None = None,
+        profile_path: str | None = None,
+        layer_version_path: str | None = None,
     ):
+        """
+        layer_version_pathを指定した場合、名前で指定されたlambda layerのversionをlayer_version_pathに保存します
+        cache_dirを指定した場合、synth間で再利用できる計算結果をcache_dir中に保存し、次回のsynthで再利用します
+        profile_pathを指定した場合、処理毎の時間と作成したconstructの数を計測し、profile_pathにjsonで出力します
+        """
         print("-----------start reading specs------------")
+        profiler = SynthProfiler(profile_path is not None)
+        with profiler.phase("SynthCache"):
+            synth_cache = SynthCache(cache_dir)
+
         # schema_check
         if schema_path is not None:
-            with open(schema_path) as f:
-                json_schema = json.load(f)
-
-            Draft202012Validator.check_schema(json_schema)
-            Draft202012Validator(json_schema).validate(spec_dict)
-
+            with profiler.phase("SpecValidator"):
+                SpecValidator(schema_path, synth_cache).validate(spec_dict)
         websystem = WebSystemCreator(
             self,
             spec_dict["service_name"],
@@ -470,15 +620,27 @@ class WebSystemStack(Stack):
             default_runtime=spec_dict.get("default_runtime"),
             repository_root=spec_dict.get("repository_root"),
             repository_token=access_token,
+            synth_cache=synth_cache,
+            branch_stack=spec_dict.get("branch_stack"),
+            profiler=profiler,
+            layer_version_path=layer_version_path,
         )
+        with profiler.phase("add_cache_sections"):
+            websystem.add_cache_sections(spec_dict)
+
+        with profiler.phase("create"):
+            websystem.create(
+                spec_dict["lambda_func"],
+                apigw_spec=spec_dict.get("apigw"),
+                s3_spec_dict=spec_dict.get("s3"),
+                sns_spec_dict=spec_dict.get("sns"),
+                batch_spec_dict=spec_dict.get("batch_func"),
+                amplify_spec_dict=spec_dict.get("amplify"),
+            )
 
-        websystem.create(
-            spec_dict["lambda_func"],
-            apigw_spec=spec_dict.get("apigw"),
-            s3_spec_dict=spec_dict.get("s3"),
-            sns_spec_dict=spec_dict.get("sns"),
-            batch_spec_dict=spec_dict.get("batch_func"),
-            amplify_spec_dict=spec_dict.get("amplify"),
-        )
-
+        synth_cache.save()
+        synth_cache.print_report()
+        profiler.count_constructs(self)
+        if profile_path is not None:
+            profiler.write_report(profile_path)
         print("----------- complete ------------")
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    # ピークメモリの計測にのみ使用する（無い場合はメモリを計測しない）
+    import psutil
+except ImportError:
+    psutil = None
+
+LAMBDA_CODE = """import json
+
+
+def lambda_handler(event, context):
+    return {{"statusCode": 200, "body": json.dumps({{"lambda": "{lambda_key}"}})}}
+"""
+
+
+def create_spec(
+    root_path: str, lambda_num: int, branch_num: int, branch_stack: str = "single"
+) -> str:
+    """
+    lambdaをlambda_num個、branchをbranch_num個持つ合成specをroot_path中に作成し、specのパスを返します
+    各lambdaは別々のコードフォルダを持ち、apigwのルートとsqsを設定します
+    """
+    lambda_spec_dict = {}
+    route_spec_dict = {}
+    for i in range(lambda_num):
+        lambda_key = f"func_{i:04d}"
+        code_path = os.path.join(root_path, "src_lambda", lambda_key, "src", "api")
+        os.makedirs(code_path, exist_ok=True)
+        with open(os.path.join(code_path, "lambda_function.py"), "w") as f:
+            f.write(LAMBDA_CODE.format(lambda_key=lambda_key))
+
+        lambda_spec_dict[lambda_key] = {
+            "code": f"src_lambda/{lambda_key}/src",
+            "timeout": 3,
+            "queue": {"additional_timeout": 10},
+        }
+        route_spec_dict[lambda_key] = {
+            "route": [f"GET /{lambda_key}", f"POST /{lambda_key}/{{path1}}"]
+        }
+
+    spec = {
+        "stack": "synth-benchmark-stack",
+        "service_name": "synth-benchmark",
+        "api_name": "synth-benchmark",
+        "lambda_handler": "api.lambda_function.lambda_handler",
+        "default_runtime": "PYTHON_3_13",
+        "branch": {
+            f"branch{i}": {"apigw_stage": "$default" if i == 0 else f"branch{i}"}
+            for i in range(branch_num)
+        },
+        "branch_stack": branch_stack,
+        # domainはHostedZoneのlookupになるが、cdk CLIを介さずsynthする場合はダミーの値で作成される
+        "apigw": {"domain": "example.com", "lambda_integration": route_spec_dict},
+        "lambda_func": lambda_spec_dict,
+    }
+    spec_path = os.path.join(root_path, "api_spec.json")
+    with open(spec_path, "w") as f:
+        json.dump(spec, f, indent=2)
+    return spec_path
+
+
+def watch_peak_rss(pid: int, stop_event: threading.Event, result: dict):
+    """
+    pidのプロセスとその子プロセス（jsiiのnode等）のメモリ（RSS）の合計をstop_eventまで定期的に計測し、
+    最大値（バイト）をresult["peak_rss"]に設定します（windows/mac/linuxで同じ単位で計測できます）
+    """
+    result["peak_rss"] = 0
+    try:
+        process = psutil.Process(pid)
+    except psutil.Error:
+        return
+    while not stop_event.is_set():
+        try:
+            rss = sum(
+                p.memory_info().rss
+                for p in [process] + process.children(recursive=True)
+            )
+        except psutil.Error:
+            rss = 0
+        result["peak_rss"] = max(result["peak_rss"], rss)
+        stop_event.wait(0.1)
+
+
+def run_synth(spec_path: str, out_path: str) -> dict:
+    """
+    app.pyを別プロセスで実行してsynthし、時間とピークメモリを返します
+    synthのキャッシュはout_path中に作成します（1回目のsynthはキャッシュ無し、2回目以降はキャッシュ有りで計測します）
+    """
+    pwd = os.path.dirname(os.path.abspath(__file__))
+    profile_path = os.path.join(out_path, "profile.json")
+    env = {
+        **os.environ,
+        "CDK_DEFAULT_ACCOUNT": os.environ.get("CDK_DEFAULT_ACCOUNT", "123456789012"),
+        "CDK_DEFAULT_REGION": os.environ.get("CDK_DEFAULT_REGION", "ap-northeast-1"),
+        "CDK_OUTDIR": os.path.join(out_path, "cdk.out"),
+        "CDK_CONTEXT_JSON": json.dumps(
+            {
+                "spec": spec_path,
+                "profile": profile_path,
+                "synth_cache_dir": os.path.join(out_path, ".synth_cache"),
+                "stub_layer_version": "true",
+            }
+        ),
+    }
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(pwd, "app.py")],
+        cwd=pwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    stop_event = threading.Event()
+    memory = {}
+    watcher = None
+    if psutil is not None:
+        watcher = threading.Thread(
+            target=watch_peak_rss, args=(proc.pid, stop_event, memory)
+        )
+        watcher.start()
+    _, stderr = proc.communicate()
+    elapsed_sec = time.perf_counter() - start
+    stop_event.set()
+    if watcher is not None:
+        watcher.join()
+    if proc.returncode != 0:
+        raise Exception(f"synth failed:\n{stderr.decode()}")
+
+    with open(profile_path) as f:
+        profile = json.load(f)
+    return {
+        "synth_sec": elapsed_sec,
+        "max_rss_mb": (memory["peak_rss"] / 1024**2 if "peak_rss" in memory else None),
+        "construct_total": profile["construct_total"],
+        "phase": {name: record["sec"] for name, record in profile["phase"].items()},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="lambda数×branch数の合成specでcdk synthの時間とピークメモリを計測します"
+    )
+    parser.add_argument(
+        "--lambda_num", type=int, nargs="+", default=[10, 40], help="lambdaの数"
+    )
+    parser.add_argument(
+        "--branch_num", type=int, nargs="+", default=[1, 4], help="branchの数"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=2,
+        help="同じspecでsynthする回数（2回目以降はキャッシュが効く）",
+    )
+    parser.add_argument(
+        "--branch_stack", default="single", choices=["single", "nested"]
+    )
+    parser.add_argument("--output", default=None, help="結果を出力するjsonのパス")
+    args = parser.parse_args()
+    if psutil is None:
+        print("[Warn] psutil is not installed: peak memory is not measured")
+
+    result_list = []
+    for lambda_num in args.lambda_num:
+        for branch_num in args.branch_num:
+            with tempfile.TemporaryDirectory() as tmp_path:
+                spec_path = create_spec(
+                    tmp_path, lambda_num, branch_num, args.branch_stack
+                )
+
+                for i in range(args.repeat):
+                    result = run_synth(spec_path, tmp_path)
+                    result = {
+                        "lambda_num": lambda_num,
+                        "branch_num": branch_num,
+                        "run": i,
+                        **result,
+                    }
+                    print(
+                        "lambda={} branch={} run={}: {:.2f} sec, {} MB, {} constructs".format(
+                            lambda_num,
+                            branch_num,
+                            i,
+                            result["synth_sec"],
+                            (
+                                "-"
+                                if result["max_rss_mb"] is None
+                                else "{:.0f}".format(result["max_rss_mb"])
+                            ),
+                            result["construct_total"],
+                        )
+                    )
+                    result_list.append(result)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(result_list, f, indent=2)
@@ -1,77 +1,530 @@
-import os
-
-from awsutil.docker_util import Docker
-from awsutil.aws_upload_util import LambdaLayerUploader
-
-
-def create_and_upload_layer(
-    layer_name: str,
-    pip_install_args: str,
-    zip_name: str,
-    *,
-    amazon_linux_version: str,
-    python_version: str,
-    runtime: str,
-    image_tag: str,
-):
-
-    success, installed = create_layer(
-        pip_install_args,
-        zip_name,
-        amazon_linux_version=amazon_linux_version,
-        python_version=python_version,
-        image_tag=image_tag,
-    )
-
-    if success:
-        mount_path = os.path.join(os.path.dirname(__file__), "mount")
-        upload_layer(
-            os.path.join(mount_path, zip_name),
-            layer_name,
-            runtime,
-            description=f"{python_version}:{installed}",
-            skip_same_description=True,
-        )
-
-
-def upload_layer(
-    zip_path: str,
-    layer_name: str,
-    runtime: str,
-    *,
-    description: str | None = None,
-    skip_same_description: bool = False,
-):
-    LambdaLayerUploader(layer_name, runtime).upload(
-        zip_path, description=description, skip_same_description=skip_same_description
-    )
-
-
-def create_layer(
-    pip_install_args: str,
-    zip_name: str,
-    *,
-    amazon_linux_version: str,
-    python_version: str,
-    image_tag: str,
-) -> tuple[bool, str]:
-    docker_path = os.path.join(
-        os.path.dirname(__file__), "docker", f"amazonlinux{amazon_linux_version}"
-    )
-    docker = Docker(image_tag)
-    print("[BUILD IMAGE] please wait a few minutes")
-    docker.build(
-        docker_path,
-        build_args={
-            "PYTHON_VER": python_version,
-        },
-    )
-    print("[RUN CONTAINER]")
-    mount_path = os.path.join(os.path.dirname(__file__), "mount")
-
-    success, installed = docker.run(mount_path, f"{zip_name} {pip_install_args}")
-    if success:
-        print(f"layerを作成しました：{installed}")
-    else:
-        print("layerの作成に失敗しました")
-    return success, installed
+import hashlib
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from awsutil.docker_util import Docker
+from awsutil.aws_upload_util import LambdaLayerUploader
+
+# 複数のlayerを並列に作成する場合の最大並列数
+DEFAULT_MAX_WORKERS = 4
+
+# pipのキャッシュ（mount/.pip_cache）の上限サイズ（MB）。超えた分は古いファイルから削除する
+DEFAULT_PIP_CACHE_MAX_MB = 2048
+
+# prewarm_base_imagesで作成するベースイメージの(python_version, amazon_linux_version)の組み合わせ
+DEFAULT_BASE_MATRIX = [
+    ("3.13", "2023"),
+    ("3.12", "2023"),
+    ("3.13", "2"),
+    ("3.12", "2"),
+]
+
+# 複数の組み合わせのlayerを作成する場合のlayer名のテンプレート
+# {layer}: 指定したlayer名、{al}: amazonlinuxのversion、{py}: pythonのversion（"."は"_"に置換）
+# ※layerの名前は最新のversionで参照される為、組み合わせ毎に別の名前にする
+DEFAULT_NAME_TEMPLATE = "{layer}-al{al}-py{py}"
+
+# amazonlinuxのversion毎のベースイメージbuildのロック
+# 同じamazonlinuxのイメージは共通のlayer（OSのパッケージ・pyenv）を持つので、
+# 同時にbuildせずに順番にbuildしてdockerのbuildキャッシュを共有する
+_build_lock_dict: dict[str, threading.Lock] = {}
+_build_lock_dict_lock = threading.Lock()
+
+# --optimize時に削除するファイル/フォルダ（pip installしたフォルダからの相対パスのglobパターン）
+DEFAULT_PRUNE_LIST = [
+    "**/__pycache__",
+    "**/tests",
+    "*.dist-info/RECORD",
+]
+
+
+def get_optimize_config(
+    *,
+    optimize: bool = False,
+    prune_list: list[str] | None = None,
+    strip: bool = False,
+    pyc_only: bool = False,
+) -> dict | None:
+    """
+    layerのサイズを小さくする為の設定（optimize.pyに渡す設定）を返します。何もしない場合はNoneを返します
+    """
+    if not (optimize or prune_list or strip or pyc_only):
+        return None
+    return {
+        "prune": (DEFAULT_PRUNE_LIST if optimize else []) + (prune_list or []),
+        "strip": strip,
+        "pyc_only": pyc_only,
+    }
+
+
+def get_image_tag(amazon_linux_version: str, python_version: str) -> str:
+    return f"lambda-layer-build:al{amazon_linux_version}py{python_version}"
+
+
+def get_docker_path(amazon_linux_version: str) -> str:
+    return os.path.join(
+        os.path.dirname(__file__), "docker", f"amazonlinux{amazon_linux_version}"
+    )
+
+
+def get_base_image_tag(amazon_linux_version: str, python_version: str) -> str:
+    """
+    ベースイメージ（amazonlinux + pythonのインタプリタ）のタグを返します
+    タグにはbase/Dockerfileのハッシュを含めるので、Dockerfileを変更すると別のイメージとしてbuildし直されます
+    """
+    base_dockerfile_path = os.path.join(
+        get_docker_path(amazon_linux_version), "base", "Dockerfile"
+    )
+    dockerfile_hash = hashlib.sha256(
+        _read_file_for_hash(base_dockerfile_path)
+    ).hexdigest()
+    return f"lambda-layer-base:al{amazon_linux_version}py{python_version}-{dockerfile_hash[:12]}"
+
+
+def build_base_image(amazon_linux_version: str, python_version: str) -> str:
+    """
+    ベースイメージをbuildし、タグを返します
+    pythonのインタプリタのコンパイルには数分かかるため、同じタグのイメージがあればbuildしません
+    """
+    base_image_tag = get_base_image_tag(amazon_linux_version, python_version)
+    with _get_build_lock(amazon_linux_version):
+        if _exists_image(base_image_tag):
+            return base_image_tag
+        print(f"[BUILD BASE IMAGE] {base_image_tag} please wait a few minutes")
+        Docker(base_image_tag).build(
+            os.path.join(get_docker_path(amazon_linux_version), "base"),
+            build_args={
+                "PYTHON_VER": python_version,
+            },
+        )
+    return base_image_tag
+
+
+def prewarm_base_images(
+    matrix: list[tuple[str, str]] = DEFAULT_BASE_MATRIX,
+    *,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> list[dict]:
+    """
+    matrixで指定した(python_version, amazon_linux_version)の組み合わせ毎にベースイメージを作成しておきます
+    以降のlayerの作成ではpythonのコンパイルを行わず、pip installのみを行います
+    """
+    matrix = list(dict.fromkeys(matrix))  # 重複を除く
+
+    def build(python_version: str, amazon_linux_version: str) -> dict:
+        result = {
+            "python_version": python_version,
+            "amazon_linux_version": amazon_linux_version,
+            "tag": get_base_image_tag(amazon_linux_version, python_version),
+        }
+        start = time.perf_counter()
+        try:
+            cached = _exists_image(result["tag"])
+            build_base_image(amazon_linux_version, python_version)
+            result["build"] = "exists" if cached else "built"
+        except Exception as e:
+            print(f"[Error] failed to build base image {result['tag']}: {e}")
+            result["build"] = "failed"
+        result["sec"] = time.perf_counter() - start
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        result_list = list(executor.map(lambda entry: build(*entry), matrix))
+
+    print("--------- result")
+    print("{:<8} {:<6} {:<8} {:>8}  {}".format("python", "al", "build", "sec", "tag"))
+    for result in result_list:
+        print(
+            "{python_version:<8} {amazon_linux_version:<6} {build:<8} {sec:>8.1f}  {tag}".format(
+                **result
+            )
+        )
+    return result_list
+
+
+def _exists_image(image_tag: str) -> bool:
+    return (
+        subprocess.run(
+            ["docker", "image", "inspect", image_tag],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        ).returncode
+        == 0
+    )
+
+
+def get_zip_name(amazon_linux_version: str, python_version: str) -> str:
+    return f"al{amazon_linux_version}py{python_version}.zip"
+
+
+def get_runtime(python_version: str) -> str:
+    return "python{}".format(".".join(python_version.split(".")[0:2]))
+
+
+def get_layer_name(
+    layer_name: str,
+    name_template: str,
+    amazon_linux_version: str,
+    python_version: str,
+) -> str:
+    return name_template.format(
+        layer=layer_name,
+        al=amazon_linux_version,
+        py=python_version.replace(".", "_"),
+    )
+
+
+def create_and_upload_layer(
+    layer_name: str,
+    pip_install_args: str,
+    *,
+    matrix: list[tuple[str, str]],
+    name_template: str | None = None,
+    use_cache: bool = True,
+    optimize_config: dict | None = None,
+    use_pip_cache: bool = True,
+    pip_cache_max_mb: int = DEFAULT_PIP_CACHE_MAX_MB,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> list[dict]:
+    """
+    matrixで指定した(python_version, amazon_linux_version)の組み合わせ毎にlayerを作成し、アップロードします
+    - アップロード先のlayer名はname_templateから組み合わせ毎に作成します（get_layer_nameを参照）
+      name_templateがNoneの場合、組み合わせが1つであればlayer_name、複数であればDEFAULT_NAME_TEMPLATEを使用します
+    - 同じlayer名に複数の組み合わせをアップロードすると、最後にアップロードしたものが最新のversionになり
+      他のruntime/OSのlambdaから参照されてしまうため、layer名が重複する場合は例外をスローします
+    - layerの作成は組み合わせ毎に別々のコンテナで並列に実行します（最大max_workers個）
+    - アップロードは作成が終わった後に組み合わせの順に行います
+    - 最後に結果の一覧を表示し、組み合わせ毎の結果を返します
+    """
+    matrix = list(dict.fromkeys(matrix))  # 重複を除く
+    if name_template is None:
+        name_template = "{layer}" if len(matrix) == 1 else DEFAULT_NAME_TEMPLATE
+    layer_name_list = [
+        get_layer_name(layer_name, name_template, amazon_linux_version, python_version)
+        for python_version, amazon_linux_version in matrix
+    ]
+    if len(set(layer_name_list)) < len(layer_name_list):
+        raise Exception(
+            f"layer name template '{name_template}' gives the same layer name to multiple python/amazonlinux versions: {layer_name_list}"
+        )
+    layer_name_dict = dict(zip(matrix, layer_name_list))
+
+    def create(python_version: str, amazon_linux_version: str) -> dict:
+        result = {
+            "python_version": python_version,
+            "amazon_linux_version": amazon_linux_version,
+            "layer_name": layer_name_dict[(python_version, amazon_linux_version)],
+            "runtime": get_runtime(python_version),
+            "zip_name": get_zip_name(amazon_linux_version, python_version),
+            "cache_key": get_layer_cache_key(
+                pip_install_args,
+                amazon_linux_version=amazon_linux_version,
+                python_version=python_version,
+                optimize_config=optimize_config,
+            ),
+            "installed": "",
+            "upload": "-",
+        }
+        start = time.perf_counter()
+        try:
+            cached = use_cache and get_cached_layer(result["cache_key"]) is not None
+            success, result["installed"] = create_layer(
+                pip_install_args,
+                result["zip_name"],
+                amazon_linux_version=amazon_linux_version,
+                python_version=python_version,
+                image_tag=get_image_tag(amazon_linux_version, python_version),
+                use_cache=use_cache,
+                optimize_config=optimize_config,
+                use_pip_cache=use_pip_cache,
+                pip_cache_max_mb=pip_cache_max_mb,
+            )
+            result["build"] = ("cached" if cached else "built") if success else "failed"
+        except Exception as e:
+            print(f"[Error] failed to create layer {result['zip_name']}: {e}")
+            result["build"] = "failed"
+        result["sec"] = time.perf_counter() - start
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        result_list = list(executor.map(lambda entry: create(*entry), matrix))
+
+    for result in result_list:
+        if result["build"] == "failed":
+            continue
+        try:
+            result["upload"] = _upload_created_layer(
+                result["layer_name"],
+                result["zip_name"],
+                result["cache_key"],
+                runtime=result["runtime"],
+                description=f"{result['python_version']}:{result['installed']}",
+                use_cache=use_cache,
+            )
+        except Exception as e:
+            print(f"[Error] failed to upload layer {result['zip_name']}: {e}")
+            result["upload"] = "failed"
+
+    print_result_table(result_list)
+    return result_list
+
+
+def print_result_table(result_list: list[dict]):
+    print("--------- result")
+    print(
+        "{:<8} {:<6} {:<8} {:<8} {:>8}  {:<30} {}".format(
+            "python", "al", "build", "upload", "sec", "layer", "installed"
+        )
+    )
+    for result in result_list:
+        print(
+            "{python_version:<8} {amazon_linux_version:<6} {build:<8} {upload:<8} {sec:>8.1f}  {layer_name:<30} {installed}".format(
+                **result
+            )
+        )
+
+
+def _upload_created_layer(
+    layer_name: str,
+    zip_name: str,
+    cache_key: str,
+    *,
+    runtime: str,
+    description: str,
+    use_cache: bool,
+) -> str:
+    """
+    mount/zip_nameをアップロードし、"uploaded"を返します
+    use_cacheがTrueで、同じzipを同じlayer_name・runtimeにアップロード済みの場合はアップロードせずに"skipped"を返します
+    """
+    manifest = _read_layer_cache_manifest(cache_key)
+    upload_key = f"{layer_name}:{runtime}"
+    if use_cache and upload_key in manifest.get("uploaded", []):
+        print(f"[SKIP UPLOAD] same layer is already uploaded to {layer_name}")
+        return "skipped"
+
+    mount_path = os.path.join(os.path.dirname(__file__), "mount")
+    upload_layer(
+        os.path.join(mount_path, zip_name),
+        layer_name,
+        runtime,
+        description=description,
+        skip_same_description=True,
+    )
+    if manifest:
+        manifest["uploaded"] = manifest.get("uploaded", []) + [upload_key]
+        _write_layer_cache_manifest(cache_key, manifest)
+    return "uploaded"
+
+
+def upload_layer(
+    zip_path: str,
+    layer_name: str,
+    runtime: str,
+    *,
+    description: str | None = None,
+    skip_same_description: bool = False,
+):
+    LambdaLayerUploader(layer_name, runtime).upload(
+        zip_path, description=description, skip_same_description=skip_same_description
+    )
+
+
+def create_layer(
+    pip_install_args: str,
+    zip_name: str,
+    *,
+    amazon_linux_version: str,
+    python_version: str,
+    image_tag: str,
+    use_cache: bool = True,
+    optimize_config: dict | None = None,
+    use_pip_cache: bool = True,
+    pip_cache_max_mb: int = DEFAULT_PIP_CACHE_MAX_MB,
+) -> tuple[bool, str]:
+    """
+    dockerコンテナ中でpip installしたパッケージをmount/zip_nameにzipで出力します
+    use_cacheがTrueの場合、同じ条件（get_layer_cache_keyを参照）で作成済みのzipがあればコンテナを実行せずにそれを使用します
+    optimize_configを指定した場合、zipする前にoptimize.pyで不要なファイルを削除します（get_optimize_configを参照）
+    use_pip_cacheがTrueの場合、pipはmount/.pip_cacheにダウンロード・buildしたwheelをキャッシュし、次回以降に再利用します
+    （pip install後にコンテナ中でevict_pip_cache.pyを実行し、キャッシュをpip_cache_max_mb以下にします）
+    """
+    cache_key = get_layer_cache_key(
+        pip_install_args,
+        amazon_linux_version=amazon_linux_version,
+        python_version=python_version,
+        optimize_config=optimize_config,
+    )
+    mount_path = os.path.join(os.path.dirname(__file__), "mount")
+    cache_zip_path = os.path.join(get_layer_cache_path(), f"{cache_key}.zip")
+    installed = get_cached_layer(cache_key) if use_cache else None
+    if installed is not None:
+        shutil.copyfile(cache_zip_path, os.path.join(mount_path, zip_name))
+        print(f"[CACHE HIT] 作成済みのlayerを使用します：{installed}")
+        return True, installed
+
+    # pythonのインタプリタはベースイメージに作成済みのものを使用し、layer作成用のイメージではscriptの追加のみ行う
+    base_image_tag = build_base_image(amazon_linux_version, python_version)
+    docker = Docker(image_tag)
+    print(f"[BUILD IMAGE] {image_tag}")
+    docker.build(
+        get_docker_path(amazon_linux_version),
+        build_args={
+            "BASE_IMAGE": base_image_tag,
+        },
+    )
+    # optimizeとpipのキャッシュの設定はmountフォルダ経由でコンテナに渡す
+    _write_container_config(
+        os.path.join(mount_path, ".optimize", f"{zip_name}.json"), optimize_config
+    )
+    _write_container_config(
+        os.path.join(mount_path, ".pip_cache_config", f"{zip_name}.json"),
+        {"max_mb": pip_cache_max_mb} if use_pip_cache else None,
+    )
+
+    # zip -rは既存のzipに追加するため、前回のzip（キャッシュからコピーしたもの等）を削除しておく
+    zip_path = os.path.join(mount_path, zip_name)
+    if os.path.exists(zip_path):
+        os.remove(zip_path)
+
+    print(f"[RUN CONTAINER] {image_tag}")
+
+    # pip installの引数（キャッシュのキー）は変えずに、キャッシュを使用しない場合のみ--no-cache-dirを加える
+    success, installed = docker.run(
+        mount_path,
+        f"{zip_name} {pip_install_args}" + ("" if use_pip_cache else " --no-cache-dir"),
+    )
+    if success:
+        print(f"layerを作成しました：{installed}")
+        os.makedirs(get_layer_cache_path(), exist_ok=True)
+        shutil.copyfile(os.path.join(mount_path, zip_name), cache_zip_path)
+        _write_layer_cache_manifest(
+            cache_key,
+            {
+                "installed": installed,
+                "pip_install_args": pip_install_args,
+                "amazon_linux_version": amazon_linux_version,
+                "python_version": python_version,
+                "optimize_config": optimize_config,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "uploaded": [],
+            },
+        )
+    else:
+        print("layerの作成に失敗しました")
+    return success, installed
+
+
+def _write_container_config(path: str, config: dict | None):
+    """
+    コンテナに渡す設定をpathに書き込みます。configがNoneの場合は（前回の）設定を削除します
+    """
+    if config is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(config, f, indent=2)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _get_build_lock(amazon_linux_version: str) -> threading.Lock:
+    with _build_lock_dict_lock:
+        return _build_lock_dict.setdefault(amazon_linux_version, threading.Lock())
+
+
+def get_layer_cache_path() -> str:
+    return os.path.join(os.path.dirname(__file__), "mount", ".layer_cache")
+
+
+def get_layer_cache_key(
+    pip_install_args: str,
+    *,
+    amazon_linux_version: str,
+    python_version: str,
+    optimize_config: dict | None = None,
+) -> str:
+    """
+    layerのキャッシュのキーを返します。下記が同じであれば同じキーになります
+    - pip_install_args、及び-r/-cで指定されたファイルの内容
+    - python_version、amazon_linux_version
+    - optimize_config
+    - layerを作成するdockerイメージの定義（Dockerfile, entrypoint.sh, optimize.py, evict_pip_cache.py, base/Dockerfile）
+    """
+    mount_path = os.path.join(os.path.dirname(__file__), "mount")
+    docker_path = get_docker_path(amazon_linux_version)
+    sha = hashlib.sha256()
+    sha.update(f"{amazon_linux_version}:{python_version}".encode())
+    sha.update(json.dumps(optimize_config, sort_keys=True).encode())
+
+    arg_list = shlex.split(pip_install_args)
+    sha.update(json.dumps(arg_list).encode())
+    for i, arg in enumerate(arg_list):
+        path = None
+        if arg in ["-r", "--requirement", "-c", "--constraint"]:
+            path = arg_list[i + 1] if i + 1 < len(arg_list) else None
+        elif arg.startswith(("--requirement=", "--constraint=")):
+            path = arg.split("=", 1)[1]
+        elif arg.startswith(("-r", "-c")) and not arg.startswith("--"):
+            path = arg[2:].strip()
+        if path is not None:
+            # コンテナ内では/mountもしくはmountフォルダからの相対パスで指定される
+            if path.startswith("/mount/"):
+                path = path[len("/mount/") :]
+            host_path = os.path.join(mount_path, path)
+            # ファイルが無いとファイルの変更がキーに反映されず古いキャッシュを使用してしまうため、エラーとする
+            if not os.path.isfile(host_path):
+                raise FileNotFoundError(
+                    f"{host_path} is not found: files passed by -r/-c must be placed in mount folder "
+                    "and specified by the path from mount folder (e.g. -r sample/requirements.txt)"
+                )
+            sha.update(_read_file_for_hash(host_path))
+
+    for file_name in [
+        "Dockerfile",
+        "entrypoint.sh",
+        "optimize.py",
+        "evict_pip_cache.py",
+        "base/Dockerfile",
+    ]:
+        sha.update(_read_file_for_hash(os.path.join(docker_path, file_name)))
+    return sha.hexdigest()
+
+
+def get_cached_layer(cache_key: str) -> str | None:
+    """
+    cache_keyのlayerが作成済みであればインストールされたパッケージを返します。作成済みでなければNoneを返します
+    """
+    manifest = _read_layer_cache_manifest(cache_key)
+    if manifest and os.path.exists(
+        os.path.join(get_layer_cache_path(), f"{cache_key}.zip")
+    ):
+        return manifest["installed"]
+    return None
+
+
+def _read_file_for_hash(path: str) -> bytes:
+    if not os.path.exists(path):
+        return f"<not found:{path}>".encode()
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _read_layer_cache_manifest(cache_key: str) -> dict:
+    path = os.path.join(get_layer_cache_path(), f"{cache_key}.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_layer_cache_manifest(cache_key: str, manifest: dict):
+    os.makedirs(get_layer_cache_path(), exist_ok=True)
+    path = os.path.join(get_layer_cache_path(), f"{cache_key}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
@@ -1,6 +1,12 @@
 import argparse
 
-from command import create_layer
+from command import (
+    DEFAULT_PIP_CACHE_MAX_MB,
+    create_layer,
+    get_image_tag,
+    get_optimize_config,
+    get_zip_name,
+)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -17,15 +23,57 @@ if __name__ == "__main__":
         help="amazon_linux_version e.g. 2023",
         default="2023",
     )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="ignore cached layer (mount/.layer_cache) and build it again",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="use_pip_cache",
+        action="store_false",
+        help="do not use pip wheel cache (mount/.pip_cache)",
+    )
+    parser.add_argument(
+        "--pip_cache_max_mb",
+        type=int,
+        default=DEFAULT_PIP_CACHE_MAX_MB,
+        help="max size of pip wheel cache: older files are removed after pip install",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="remove __pycache__, tests and dist-info RECORD before zipping",
+    )
+    parser.add_argument(
+        "--prune",
+        action="append",
+        default=[],
+        help="glob pattern (relative to installed dir) to remove before zipping",
+    )
+    parser.add_argument(
+        "--strip", action="store_true", help="strip debug symbols from .so files"
+    )
+    parser.add_argument(
+        "--pyc_only",
+        action="store_true",
+        help="keep only precompiled .pyc instead of .py",
+    )
     args = parser.parse_args()
-    pv: str = args.python_version
-    image_tag = f"lambda-layer-build:al{args.amazon_linux_version}py{pv}"
 
-    zip_name = f"al{args.amazon_linux_version}py{args.python_version}.zip"
     create_layer(
         " ".join(args.pip_install_args),
-        zip_name,
+        get_zip_name(args.amazon_linux_version, args.python_version),
         python_version=args.python_version,
         amazon_linux_version=args.amazon_linux_version,
-        image_tag=image_tag,
+        image_tag=get_image_tag(args.amazon_linux_version, args.python_version),
+        use_cache=not args.rebuild,
+        optimize_config=get_optimize_config(
+            optimize=args.optimize,
+            prune_list=args.prune,
+            strip=args.strip,
+            pyc_only=args.pyc_only,
+        ),
+        use_pip_cache=args.use_pip_cache,
+        pip_cache_max_mb=args.pip_cache_max_mb,
     )
@@ -1,6 +1,11 @@
 import argparse
 
-from command import create_and_upload_layer
+from command import (
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_PIP_CACHE_MAX_MB,
+    create_and_upload_layer,
+    get_optimize_config,
+)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="create lambda layer and upload it")
@@ -8,26 +13,84 @@ if __name__ == "__main__":
     parser.add_argument("layer", help="name of layer")
     parser.add_argument("pip_install_args", nargs="*")
     parser.add_argument(
-        "-p", "--python_version", help="python_version e.g. 3.12.3", default="3.13"
+        "-p",
+        "--python_version",
+        action="append",
+        help="python_version e.g. 3.12.3 (repeatable: layers are built for each combination of -p and -a)",
     )
     parser.add_argument(
         "-a",
         "--amazon_linux_version",
-        help="amazon_linux_version e.g. 2023",
-        default="2023",
+        action="append",
+        help="amazon_linux_version e.g. 2023 (repeatable)",
+    )
+    parser.add_argument(
+        "--name_template",
+        default=None,
+        help="layer name for each combination of -p and -a: {layer}, {al} and {py} are replaced "
+        "(default: {layer} for one combination, {layer}-al{al}-py{py} for multiple combinations)",
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help="max number of layers built concurrently",
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="ignore cached layer (mount/.layer_cache) and build it again",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="use_pip_cache",
+        action="store_false",
+        help="do not use pip wheel cache (mount/.pip_cache)",
+    )
+    parser.add_argument(
+        "--pip_cache_max_mb",
+        type=int,
+        default=DEFAULT_PIP_CACHE_MAX_MB,
+        help="max size of pip wheel cache: older files are removed after pip install",
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="remove __pycache__, tests and dist-info RECORD before zipping",
+    )
+    parser.add_argument(
+        "--prune",
+        action="append",
+        default=[],
+        help="glob pattern (relative to installed dir) to remove before zipping",
+    )
+    parser.add_argument(
+        "--strip", action="store_true", help="strip debug symbols from .so files"
+    )
+    parser.add_argument(
+        "--pyc_only",
+        action="store_true",
+        help="keep only precompiled .pyc instead of .py",
     )
     args = parser.parse_args()
-    pv: str = args.python_version
-    image_tag = f"lambda-layer-build:al{args.amazon_linux_version}py{pv}"
-    runtime = "python{}".format(".".join(pv.split(".")[0:2]))
 
-    zip_name = f"al{args.amazon_linux_version}py{args.python_version}.zip"
     create_and_upload_layer(
         args.layer,
         " ".join(args.pip_install_args),
-        zip_name,
-        python_version=args.python_version,
-        amazon_linux_version=args.amazon_linux_version,
-        image_tag=image_tag,
-        runtime=runtime,
+        matrix=[
+            (python_version, amazon_linux_version)
+            for python_version in args.python_version or ["3.13"]
+            for amazon_linux_version in args.amazon_linux_version or ["2023"]
+        ],
+        name_template=args.name_template,
+        max_workers=args.max_workers,
+        use_pip_cache=args.use_pip_cache,
+        pip_cache_max_mb=args.pip_cache_max_mb,
+        use_cache=not args.rebuild,
+        optimize_config=get_optimize_config(
+            optimize=args.optimize,
+            prune_list=args.prune,
+            strip=args.strip,
+            pyc_only=args.pyc_only,
+        ),
     )
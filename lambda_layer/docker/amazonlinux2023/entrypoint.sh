@@ -3,6 +3,11 @@
 #usage: entrypoint.sh <output_zip_name> <pip_install_args> ...
 INSTALL=/python
 OUT_ZIP=/mount/$1
+OPTIMIZE_CONFIG=/mount/.optimize/$1.json
+PIP_CACHE_CONFIG=/mount/.pip_cache_config/$1.json
+# persistent pip cache on host (lambda_layer/mount/.pip_cache): downloaded/built wheels are reused
+# between builds and concurrent containers (disabled by --no-cache-dir in pip_install_args)
+export PIP_CACHE_DIR=/mount/.pip_cache
 
 # enable pyenv
 eval "$(pyenv init -)"
@@ -12,7 +17,19 @@ mkdir ${INSTALL}
 echo "--------- start to install python packages"
 pip3 install --root-user-action=ignore -t ${INSTALL} "${@:2}" || exit 1
 
+# evict old pip cache (only if config exists). files are owned by root, so this runs in the container
+if [ -f ${PIP_CACHE_CONFIG} ]; then
+    python3 /evict_pip_cache.py ${PIP_CACHE_DIR} ${PIP_CACHE_CONFIG} || exit 1
+fi
+
+# optimize (only if config exists)
+if [ -f ${OPTIMIZE_CONFIG} ]; then
+    python3 /optimize.py ${INSTALL} ${OPTIMIZE_CONFIG} || exit 1
+fi
+
 # zip
 echo "--------- start to zip installed python packages"
+# zip -r adds files to an existing archive: remove the old one to avoid mixing old packages
+rm -f ${OUT_ZIP}
 zip -q -r ${OUT_ZIP} ${INSTALL} || exit 1
 ls -l ${OUT_ZIP}
@@ -0,0 +1,52 @@
+# usage: evict_pip_cache.py <pip_cache_dir> <config_json>
+# pipのキャッシュの合計サイズが上限を超えている場合、更新日時の古いファイルから削除します
+# キャッシュはコンテナ（root）が作成するため、ホスト側ではなくコンテナ中で実行します
+# config_jsonの内容：
+# - max_mb: キャッシュの上限サイズ（MB）
+# 上限以下にできなかった場合は終了コード1で終了します
+import json
+import os
+import sys
+
+
+def evict(cache_dir: str, max_mb: int) -> int:
+    """
+    キャッシュをmax_mb以下になるよう削除し、削除後の合計サイズを返します
+    """
+    file_list = []
+    for dir_path, _, file_name_list in os.walk(cache_dir):
+        for file_name in file_name_list:
+            path = os.path.join(dir_path, file_name)
+            try:
+                stat = os.lstat(path)
+            except FileNotFoundError:
+                continue
+            file_list.append((stat.st_mtime, stat.st_size, path))
+    total_size = sum(size for _, size, _ in file_list)
+    max_size = max_mb * 1024**2
+
+    removed_size = 0
+    for _, size, path in sorted(file_list):
+        if total_size - removed_size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # 並列に実行している他のコンテナが削除済み
+            pass
+        removed_size += size
+    print(
+        "--------- pip cache: removed {:.0f}MB, {:.0f}MB / {}MB".format(
+            removed_size / 1024**2, (total_size - removed_size) / 1024**2, max_mb
+        )
+    )
+    return total_size - removed_size
+
+
+if __name__ == "__main__":
+    cache_dir = sys.argv[1]
+    with open(sys.argv[2]) as f:
+        config = json.load(f)
+    if evict(cache_dir, config["max_mb"]) > config["max_mb"] * 1024**2:
+        print(f"[Error] failed to keep pip cache under {config['max_mb']}MB")
+        sys.exit(1)
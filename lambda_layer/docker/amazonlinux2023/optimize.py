@@ -0,0 +1,113 @@
+# usage: optimize.py <install_dir> <config_json>
+# pip installしたフォルダから不要なファイルを削除し、layerのサイズを小さくします
+# config_jsonの内容：
+# - prune: 削除するファイル/フォルダのglobパターン（install_dirからの相対パス）のリスト
+# - strip: trueの場合、共有ライブラリ（.so）のデバッグシンボルを削除します
+# - pyc_only: trueの場合、.pyをコンパイルした.pycのみを残します
+import compileall
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+
+def get_size_dict(install_dir: str) -> dict[str, int]:
+    size_dict = {}
+    for name in os.listdir(install_dir):
+        path = os.path.join(install_dir, name)
+        if os.path.isdir(path):
+            size = 0
+            for dir_path, _, file_list in os.walk(path):
+                for file_name in file_list:
+                    file_path = os.path.join(dir_path, file_name)
+                    if not os.path.islink(file_path):
+                        size += os.path.getsize(file_path)
+        else:
+            size = os.path.getsize(path)
+        size_dict[name] = size
+    return size_dict
+
+
+def print_size_report(before_dict: dict[str, int], after_dict: dict[str, int]):
+    print("--------- size report (MB)")
+    print("{:<40} {:>10} {:>10}".format("package", "before", "after"))
+    for name in sorted(before_dict, key=lambda name: before_dict[name], reverse=True):
+        print(
+            "{:<40} {:>10.2f} {:>10.2f}".format(
+                name, before_dict[name] / 1024**2, after_dict.get(name, 0) / 1024**2
+            )
+        )
+    print(
+        "{:<40} {:>10.2f} {:>10.2f}".format(
+            "total",
+            sum(before_dict.values()) / 1024**2,
+            sum(after_dict.values()) / 1024**2,
+        )
+    )
+
+
+def prune(install_dir: str, pattern_list: list[str]):
+    for pattern in pattern_list:
+        for path in glob.glob(os.path.join(install_dir, pattern), recursive=True):
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.lexists(path):
+                os.remove(path)
+
+
+def is_shared_library(file_name: str) -> bool:
+    # foo.so, foo.so.1.2 等（foo.sort.py等は対象外）
+    return file_name.endswith(".so") or ".so." in file_name
+
+
+def strip(install_dir: str) -> list[str]:
+    """
+    共有ライブラリのデバッグシンボルを削除し、stripに失敗したファイルのリストを返します
+    """
+    failed_list = []
+    for dir_path, _, file_list in os.walk(install_dir):
+        for file_name in file_list:
+            path = os.path.join(dir_path, file_name)
+            if not is_shared_library(file_name) or os.path.islink(path):
+                continue
+            result = subprocess.run(
+                ["strip", "--strip-unneeded", path],
+                stderr=subprocess.PIPE,
+                text=True,
+            )
+            if result.returncode != 0:
+                print(f"[Warn] failed to strip {path}: {result.stderr.strip()}")
+                failed_list.append(path)
+    return failed_list
+
+
+def compile_pyc_only(install_dir: str):
+    # .pyと同じ場所に.pycを作成し（legacy layout）、.pyを削除する
+    if not compileall.compile_dir(install_dir, quiet=1, legacy=True):
+        print("[Warn] some .py files failed to compile: they are kept as .py")
+    for dir_path, _, file_list in os.walk(install_dir):
+        for file_name in file_list:
+            if file_name.endswith(".py"):
+                py_path = os.path.join(dir_path, file_name)
+                if os.path.exists(py_path + "c"):
+                    os.remove(py_path)
+
+
+if __name__ == "__main__":
+    install_dir = sys.argv[1]
+    with open(sys.argv[2]) as f:
+        config = json.load(f)
+    print(f"--------- start to optimize: {config}")
+
+    before_dict = get_size_dict(install_dir)
+    prune(install_dir, config.get("prune", []))
+    strip_failed_list = strip(install_dir) if config.get("strip") else []
+    if config.get("pyc_only"):
+        compile_pyc_only(install_dir)
+    print_size_report(before_dict, get_size_dict(install_dir))
+    if len(strip_failed_list) > 0:
+        print(f"strip failed: {len(strip_failed_list)} files")
+        for path in strip_failed_list:
+            print(f"  {path}")
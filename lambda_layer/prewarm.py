@@ -0,0 +1,38 @@
+import argparse
+
+from command import DEFAULT_BASE_MATRIX, DEFAULT_MAX_WORKERS, prewarm_base_images
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="build base images (amazonlinux + python) used to create lambda layers"
+    )
+
+    parser.add_argument(
+        "-p",
+        "--python_version",
+        action="append",
+        help="python_version e.g. 3.12.3 (repeatable: base images are built for each combination of -p and -a)",
+    )
+    parser.add_argument(
+        "-a",
+        "--amazon_linux_version",
+        action="append",
+        help="amazon_linux_version e.g. 2023 (repeatable)",
+    )
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=DEFAULT_MAX_WORKERS,
+        help="max number of base images built concurrently",
+    )
+    args = parser.parse_args()
+
+    if args.python_version is None and args.amazon_linux_version is None:
+        matrix = DEFAULT_BASE_MATRIX
+    else:
+        matrix = [
+            (python_version, amazon_linux_version)
+            for python_version in args.python_version or ["3.13"]
+            for amazon_linux_version in args.amazon_linux_version or ["2023"]
+        ]
+    prewarm_base_images(matrix, max_workers=args.max_workers)